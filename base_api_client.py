@@ -4,12 +4,25 @@ import time
 from abc import ABC, abstractmethod
 from loguru import logger
 
+from live_cache import LiveCache, STATS, STATS_MISSES, TTLS
+from ttl_cache import TTLCache
+from negative_cache import NegativeCache
+from single_flight import SingleFlight
+from rate_limiter import RATE_LIMITER
+
 class BaseAPIClient(ABC):
-    def __init__(self, max_concurrent=50, rate_limit_retry_delay=5):
+    def __init__(self, max_concurrent=50, rate_limit_retry_delay=5, store: LiveCache = None,
+                 max_size=50_000):
         self.user_agent = "Eve Overlay"
-        self.cache = {}
-        self.rate_limit_cache = {}
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.cache = TTLCache(max_size, TTLS[STATS], f'{self.__class__.__name__}_stats')
+        self.store = store
+        # Characters the killboard has no record of; answered locally as
+        # not_found until the entry expires.
+        self.misses = NegativeCache(max_size // 10, TTLS[STATS_MISSES], f'{self.__class__.__name__}_not_found',
+                                    store, f"{STATS_MISSES}:{self.__class__.__name__}", bloom_capacity=max_size)
+        self.rate_limit_cache = TTLCache(max_size, name=f'{self.__class__.__name__}_rate_limited')
+        self.inflight = SingleFlight(f'{self.__class__.__name__}_inflight')
+        self.max_concurrent = max_concurrent
         self.rate_limit_retry_delay = rate_limit_retry_delay
 
     @property
@@ -25,25 +38,46 @@ class BaseAPIClient(ABC):
     def _handle_response_data(self, data):
         pass
 
+    @property
+    def store_ns(self):
+        return f"{STATS}:{self.__class__.__name__}"
+
+    def _persisted_data(self, data):
+        return data
+
+    def preload(self, char_ids):
+        """Pull persisted stats for ``char_ids`` into the in-memory cache."""
+        if self.store is None:
+            return
+        self.cache.update(self.store.get_many(self.store_ns, self.cache.missing(char_ids)))
+        self.misses.preload(self.cache.missing(char_ids))
+
+    async def preload_async(self, char_ids):
+        """``preload`` on a worker thread, for callers on the network loop."""
+        if self.store is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.preload, list(char_ids))
+
     async def get_char_short_stats_batch(self, char_ids, max_concurrent=10):
-        if max_concurrent:
-            old_semaphore = self.semaphore
-            self.semaphore = asyncio.Semaphore(max_concurrent)
-        
-        try:
-            connector = aiohttp.TCPConnector(limit=max_concurrent or 50)
-            async with aiohttp.ClientSession(connector=connector) as session:
-                tasks = [self._get_char_short_stats_with_session(session, char_id) for char_id in char_ids]
-                results = await asyncio.gather(*tasks)
-                return dict(zip(char_ids, results))
-        finally:
-            if max_concurrent:
-                self.semaphore = old_semaphore
+        # A local semaphore caps this batch only; the shared per-host limiter
+        # still applies on top of it.
+        semaphore = asyncio.Semaphore(max_concurrent or self.max_concurrent)
+        await self.preload_async(char_ids)
+
+        async def fetch(session, char_id):
+            async with semaphore:
+                return await self._get_char_short_stats_with_session(session, char_id)
+
+        connector = aiohttp.TCPConnector(limit=max_concurrent or self.max_concurrent)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            results = await asyncio.gather(*[fetch(session, char_id) for char_id in char_ids])
+            return dict(zip(char_ids, results))
 
     async def _get_char_short_stats_with_session(self, session, char_id, max_retries=3):
         if char_id in self.cache:
             logger.debug(f"{self.__class__.__name__} cache hit for char {char_id}")
             return self.cache[char_id]
+        if char_id in self.misses:
+            return {'error': 'not_found', 'message': 'Not Found (cached)'}
 
         if char_id in self.rate_limit_cache:
             expire_time = self.rate_limit_cache[char_id]
@@ -51,58 +85,74 @@ class BaseAPIClient(ABC):
                 return {'error': 'rate_limited', 'retry_after': expire_time - time.time()}
             del self.rate_limit_cache[char_id]
 
-        async with self.semaphore:
-            for attempt in range(max_retries + 1):
-                try:
-                    url = self._build_url(char_id)
-                    headers = {'User-Agent': self.user_agent}
-
-                    async with session.get(url, headers=headers, timeout=10) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            processed_data = self._handle_response_data(data)
-                            if processed_data.get('error') != 'not_found':
-                                self.cache[char_id] = processed_data
-                            return processed_data
-                        elif response.status in [429, 1015]:
-                            if attempt < max_retries:
-                                logger.warning(f"{self.__class__.__name__} rate limited for char {char_id}, retrying in {self.rate_limit_retry_delay}s")
-                                await asyncio.sleep(self.rate_limit_retry_delay)
-                                continue
-                            logger.error(f"{self.__class__.__name__} rate limited for char {char_id}, max retries exceeded")
-                            self.rate_limit_cache[char_id] = time.time() + self.rate_limit_retry_delay
-                            return {'error': 'rate_limited', 'retry_after': self.rate_limit_retry_delay}
-                        elif response.status == 404:
-                            try:
-                                err_data = await response.json()
-                                err_msg = err_data.get('message', 'Not Found')
-                            except Exception:
-                                err_msg = 'Not Found'
-                            logger.error(f"{self.__class__.__name__} 404 for char {char_id}: {err_msg}")
-                            return {'error': 'not_found', 'message': err_msg}
+        # Concurrent lookups of the same character share one request.
+        url = self._build_url(char_id)
+        return await self.inflight.do(url, lambda: self._fetch_char_short_stats(session, char_id, url, max_retries))
+
+    async def _fetch_char_short_stats(self, session, char_id, url, max_retries):
+        for attempt in range(max_retries + 1):
+            try:
+                headers = {'User-Agent': self.user_agent}
+
+                async with RATE_LIMITER.slot(url) as slot, \
+                        session.get(url, headers=headers, timeout=10) as response:
+                    slot.update(response, self.rate_limit_retry_delay)
+                    if response.status == 200:
+                        data = await response.json()
+                        processed_data = self._handle_response_data(data)
+                        if processed_data.get('error') == 'not_found':
+                            self.misses.add(char_id)
                         else:
-                            try:
-                                err_data = await response.json()
-                                err_msg = err_data.get('message', str(err_data))
-                            except Exception:
-                                err_msg = await response.text()
-                            logger.error(f"{self.__class__.__name__} API error for char {char_id}: status {response.status}, msg: {err_msg}")
-                            return {'error': 'api_error', 'status': response.status, 'message': err_msg}
-                except Exception as e:
-                    if attempt < max_retries:
-                        wait_time = (2 ** attempt) * 2
-                        logger.error(f"{self.__class__.__name__} network error for char {char_id}, retrying in {wait_time}s: {type(e).__name__}: {e}")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    logger.error(f"{self.__class__.__name__} failed fetching data for {char_id}: {type(e).__name__}: {e}")
-                    return {'error': 'network_error', 'message': f"{type(e).__name__}: {e}"}
-
-            logger.error(f"{self.__class__.__name__} max retries exceeded for char {char_id}")
-            return {'error': 'max_retries_exceeded'}
+                            self.cache[char_id] = processed_data
+                            if self.store is not None:
+                                self.store.put(self.store_ns, char_id, self._persisted_data(processed_data))
+                        return processed_data
+                    elif response.status in [420, 429, 1015]:
+                        # The host limiter is now paused for every caller; the
+                        # next attempt waits for it instead of sleeping here.
+                        if attempt < max_retries:
+                            logger.warning(f"{self.__class__.__name__} rate limited for char {char_id}, retrying when {slot.limiter.host} allows")
+                            continue
+                        retry_after = max(slot.limiter.blocked_until - time.time(), self.rate_limit_retry_delay)
+                        logger.error(f"{self.__class__.__name__} rate limited for char {char_id}, max retries exceeded")
+                        self.rate_limit_cache.set(char_id, time.time() + retry_after, ttl=retry_after)
+                        return {'error': 'rate_limited', 'retry_after': retry_after}
+                    elif response.status == 404:
+                        try:
+                            err_data = await response.json()
+                            err_msg = err_data.get('message', 'Not Found')
+                        except Exception:
+                            err_msg = 'Not Found'
+                        logger.error(f"{self.__class__.__name__} 404 for char {char_id}: {err_msg}")
+                        self.misses.add(char_id)
+                        return {'error': 'not_found', 'message': err_msg}
+                    else:
+                        try:
+                            err_data = await response.json()
+                            err_msg = err_data.get('message', str(err_data))
+                        except Exception:
+                            err_msg = await response.text()
+                        logger.error(f"{self.__class__.__name__} API error for char {char_id}: status {response.status}, msg: {err_msg}")
+                        return {'error': 'api_error', 'status': response.status, 'message': err_msg}
+            except Exception as e:
+                if attempt < max_retries:
+                    wait_time = (2 ** attempt) * 2
+                    logger.error(f"{self.__class__.__name__} network error for char {char_id}, retrying in {wait_time}s: {type(e).__name__}: {e}")
+                    await asyncio.sleep(wait_time)
+                    continue
+                logger.error(f"{self.__class__.__name__} failed fetching data for {char_id}: {type(e).__name__}: {e}")
+                return {'error': 'network_error', 'message': f"{type(e).__name__}: {e}"}
+
+        logger.error(f"{self.__class__.__name__} max retries exceeded for char {char_id}")
+        return {'error': 'max_retries_exceeded'}
     
     def clear_cache(self):
-        self.cache = {}
-        self.rate_limit_cache = {}
+        self.cache.clear()
+        self.misses.clear()
+        self.rate_limit_cache.clear()
+
+    def cache_stats(self):
+        return {c.name: c.stats() for c in (self.cache, self.misses, self.rate_limit_cache, self.inflight)}
 
 class APIClientFactory:
     @staticmethod
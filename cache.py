@@ -1,12 +1,60 @@
 import json
+import time
+import zlib
+import shutil
+import threading
 import marisa_trie
-import leb128
-import io
+import numpy as np
 from pathlib import Path
+from itertools import islice, chain
 from tqdm import tqdm
 import pickle
 from loguru import logger
 
+from varint import decode_leb128
+from stream_json import iter_records
+from cache_overlay import CacheOverlay, overlay_dir, load_overlay, write_segment
+from cache_bundle import open_current, write_bundle, describe_source, source_changed
+
+# Fixed-width column files, indexed by trie id. Every value is a little-endian
+# uint32 (EVE entity ids are int32 on ESI), so a column can be mapped straight
+# from disk and shared between processes without decoding.
+COL_DTYPE = np.dtype('<u4')
+
+# Shipped LEB128/pickle sources. They are converted into a versioned bundle
+# (see cache_bundle.py) which is what actually gets mapped.
+TRIE_SOURCE = 'names.pkl'
+
+# name -> (leb128 source file, mapped column file, values per entry)
+COLUMNS = {
+    'ids': ('ids.bin', 'ids.u32', 1),
+    'char_info': ('char_info.bin', 'char_info.u32', 2),
+    'stats': ('stats.bin', 'stats.u32', 2),
+}
+COLUMN_ATTRS = {'ids': '_tid2id', 'char_info': '_char_info', 'stats': '_stats'}
+
+# Reverse id -> trie id index over characters, corporations and alliances,
+# stored as two uint32 rows (non-zero ids sorted ascending, then the matching
+# trie ids) so a name is a binary search plus Trie.restore_key instead of a
+# resident dict. The key prefix tells the kinds apart.
+ID_INDEX = 'id_index.u32'
+ENTITY_PREFIXES = '#@'
+_MAX_ID = 2 ** 32
+
+# Case-insensitive lookups: two uint32 rows, crc32 of every casefolded key
+# sorted ascending, then the trie id of its canonical spelling. Candidates are
+# confirmed against the restored key, so hash collisions are harmless and the
+# index costs 8 mapped bytes per entry instead of a second trie.
+FOLDED_INDEX = 'folded.u32'
+
+# Records remapped into trie order per batch by build_cache.
+BUILD_BATCH = 100_000
+
+# Columns in the order the warm-up thread loads them. Each lookup only waits
+# for the columns it actually reads. The overlay holds delta updates applied
+# on top of the bundle (see cache_overlay.py).
+LOAD_ORDER = ('trie', 'ids', 'char_info', 'stats', 'id_index', 'overlay', 'folded')
+
 
 class CacheManager:
     def __init__(self, cache_dir='cache'):
@@ -14,280 +62,410 @@ class CacheManager:
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         self._trie = None
         self._tid2id = None
-        self._name2tid = None
-        self._tid2name = None
         self._char_info = None
         self._stats = None
-        self._corp_id_to_name = None
-        self._alliance_id_to_name = None
+        self._id_index = None
+        self._folded = None
+        self._overlay = None
+        self._bundle = None
         self._cache_loaded = False
+        self._loaded = set()
+        self._load_lock = threading.RLock()
+        self._warmup_thread = None
+        self._start_time = time.perf_counter()
+        self.load_times = {}
+        self.first_lookup_ms = None
 
     def load_cache(self):
         if self._cache_loaded:
             return
 
         logger.info("Loading cache...")
-        trie_path = self.cache_dir / 'names.pkl'
-        ids_path = self.cache_dir / 'ids.bin'
-        char_info_path = self.cache_dir / 'char_info.bin'
-        mappings_path = self.cache_dir / 'mappings.pkl'
+        for col in LOAD_ORDER:
+            self._ensure(col)
+        self._cache_loaded = True
+        logger.info("Cache loading complete")
 
-        if self._trie is None and trie_path.exists():
-            logger.info("  Loading trie...")
-            self._trie = self.load_trie_pickle(trie_path)
-            logger.info(f"  Trie loaded: {len(self._trie):,} entries")
+    def start_warmup(self):
+        if self._cache_loaded or self._warmup_thread is not None:
+            return
+        self._warmup_thread = threading.Thread(
+            target=self.load_cache, name='cache-warmup', daemon=True)
+        self._warmup_thread.start()
+
+    def _ensure(self, *cols):
+        for col in cols:
+            if col in self._loaded:
+                continue
+            with self._load_lock:
+                if col in self._loaded:
+                    continue
+                if self._bundle is not None and not self._bundle.path.exists():
+                    # Removed by another process since we opened it; start
+                    # over from whatever CURRENT names now.
+                    logger.info(f"  Bundle {self._bundle.path.name} is gone; reopening")
+                    self._reset()
+                start = time.perf_counter()
+                self._load_column(col)
+                self._loaded.add(col)
+                now = time.perf_counter()
+                self.load_times[col] = (now - start) * 1000
+                logger.info(
+                    f"  {col} ready in {self.load_times[col]:.1f} ms "
+                    f"({(now - self._start_time) * 1000:.1f} ms since start)")
+
+    def _load_column(self, col):
+        if col == 'trie':
+            self._bundle = self._open_bundle()
+            self._trie = self._map_trie()
+        elif col in COLUMNS:
+            self._ensure('trie')
+            expected_cnt = len(self._trie) if self._trie else 0
+            setattr(self, COLUMN_ATTRS[col], self._map_column(col, expected_cnt))
+        elif col == 'id_index':
+            self._ensure('trie', 'ids')
+            self._id_index = self._map_id_index()
+        elif col == 'folded':
+            self._ensure('trie')
+            self._folded = self._map_folded_index()
+        elif col == 'overlay':
+            self._ensure('trie')
+            self._overlay = CacheOverlay() if self._bundle is None else \
+                load_overlay(overlay_dir(self.cache_dir, self._bundle.path.name))
+
+    def _open_bundle(self):
+        bundle = open_current(self.cache_dir, any_format=True)
+        if bundle is not None and not bundle.current:
+            # Older layouts are rebuilt into a fresh bundle, never upgraded in
+            # place: other processes may have the old one mapped.
+            logger.info(f"  Bundle {bundle.path.name} has format {bundle.format_version}; rebuilding")
+            same_sources = not self._sources_changed(bundle)
+            rebuilt = self._convert_sources(bundle)
+            if rebuilt is not None and same_sources:
+                self._carry_overlay(bundle, rebuilt)
+            return rebuilt
+        if bundle is not None and not self._sources_changed(bundle):
+            logger.info(f"  Using cache bundle {bundle.path.name}")
+            return bundle
+        return self._convert_sources(bundle) or bundle
+
+    def _carry_overlay(self, old, new):
+        # Same data in a new layout: deltas applied to the old bundle still
+        # apply. Copied rather than moved, since processes still on the old
+        # bundle keep reading them.
+        src = overlay_dir(self.cache_dir, old.path.name)
+        if src.exists():
+            shutil.copytree(src, overlay_dir(self.cache_dir, new.path.name), dirs_exist_ok=True)
+            logger.info(f"  Overlay segments of {old.path.name} carried over")
+
+    def _sources_changed(self, bundle):
+        for src_name in [TRIE_SOURCE] + [src for src, _, _ in COLUMNS.values()]:
+            src_path = self.cache_dir / src_name
+            if src_path.exists() and source_changed(src_path, bundle.sources.get(src_name), bundle.built_at):
+                logger.info(f"  {src_name} changed since bundle was built")
+                return True
+        return False
+
+    def _convert_sources(self, prev):
+        """Build a new bundle from the shipped sources, carrying over columns
+        of the previous bundle whose source isn't present."""
+        sources = dict(prev.sources) if prev else {}
+        trie_src = self.cache_dir / TRIE_SOURCE
+        if trie_src.exists():
+            logger.info(f"  Converting {TRIE_SOURCE}...")
+            trie = self.load_trie_pickle(trie_src)
+            sources[TRIE_SOURCE] = describe_source(trie_src)
+        elif prev is not None and prev.has('names.trie'):
+            trie = marisa_trie.Trie()
+            trie.load(str(prev.file('names.trie')))
+        else:
+            return None
 
-        expected_cnt = len(self._trie) if self._trie else 0
+        columns = {}
+        for src_name, col_name, width in COLUMNS.values():
+            src_path = self.cache_dir / src_name
+            if src_path.exists():
+                logger.info(f"  Converting {src_name}...")
+                with open(src_path, 'rb') as f:
+                    vals = decode_leb128(f.read())
+                arr = np.asarray(vals[:len(vals) - len(vals) % width], dtype=COL_DTYPE)
+                sources[src_name] = describe_source(src_path)
+            elif prev is not None and prev.has(col_name):
+                arr = np.fromfile(prev.file(col_name), dtype=COL_DTYPE)
+            else:
+                continue
+            columns[col_name] = (arr, len(arr) // width)
+
+        ids = columns.get(COLUMNS['ids'][1])
+        if ids is not None and ids[1] == len(trie):
+            index = self._build_id_index(ids[0])
+            columns[ID_INDEX] = (index, index.shape[1])
+        folded = self._build_folded_index(trie)
+        columns[FOLDED_INDEX] = (folded, folded.shape[1])
+
+        return write_bundle(self.cache_dir, trie, columns, sources)
+
+    def _map_trie(self):
+        bundle = self._bundle
+        if bundle is None or not bundle.verify('names.trie', bundle.entry_count):
+            return None
+        trie = marisa_trie.Trie()
+        trie.mmap(str(bundle.file('names.trie')))
+        logger.info(f"  Trie mapped: {len(trie):,} entries")
+        return trie
 
-        ids_pkl_path = self.cache_dir / 'ids.pkl'
-        if self._tid2id is None:
-            if ids_pkl_path.exists():
-                logger.info("  Loading IDs (cached)...")
-                with open(ids_pkl_path, 'rb') as f:
-                    self._tid2id = pickle.load(f)
-                logger.info(f"  IDs loaded: {len(self._tid2id):,} total")
-            elif ids_path.exists():
-                logger.info("  Loading IDs (first run)...")
-                with open(ids_path, 'rb') as f:
-                    data = f.read()
-                self._tid2id = [0] * expected_cnt
-                bio, idx = io.BytesIO(data), 0
-                while bio.tell() < len(data):
-                    try:
-                        id_val, _ = leb128.i.decode_reader(bio)
-                        self._tid2id[idx] = id_val
-                        idx += 1
-                    except:
-                        break
-                logger.info(f"  IDs loaded: {idx:,} total")
-                logger.info("  Saving IDs cache...")
-                with open(ids_pkl_path, 'wb') as f:
-                    pickle.dump(self._tid2id, f,
-                                protocol=pickle.HIGHEST_PROTOCOL)
-
-        char_info_pkl_path = self.cache_dir / 'char_info.pkl'
-        if self._char_info is None:
-            if char_info_pkl_path.exists():
-                logger.info("  Loading char info (cached)...")
-                with open(char_info_pkl_path, 'rb') as f:
-                    self._char_info = pickle.load(f)
-                logger.info(
-                    f"  Char info loaded: {len(self._char_info):,} total")
-            elif char_info_path.exists():
-                logger.info("  Loading char info (first run)...")
-                with open(char_info_path, 'rb') as f:
-                    data = f.read()
-                self._char_info = [None] * expected_cnt
-                bio, idx = io.BytesIO(data), 0
-                while bio.tell() < len(data):
-                    try:
-                        corp_id, _ = leb128.i.decode_reader(bio)
-                        alliance_id, _ = leb128.i.decode_reader(bio)
-                        self._char_info[idx] = None if corp_id == 0 else (
-                            corp_id, alliance_id)
-                        idx += 1
-                    except:
-                        break
-                logger.info(f"  Char info loaded: {idx:,} total")
-                logger.info("  Saving char info cache...")
-                with open(char_info_pkl_path, 'wb') as f:
-                    pickle.dump(self._char_info, f,
-                                protocol=pickle.HIGHEST_PROTOCOL)
-
-        stats_path = self.cache_dir / 'stats.bin'
-        stats_pkl_path = self.cache_dir / 'stats.pkl'
-        if self._stats is None:
-            if stats_pkl_path.exists():
-                logger.info("  Loading stats (cached)...")
-                with open(stats_pkl_path, 'rb') as f:
-                    self._stats = pickle.load(f)
-                logger.info(f"  Stats loaded: {len(self._stats):,} total")
-            elif stats_path.exists():
-                logger.info("  Loading stats (first run)...")
-                with open(stats_path, 'rb') as f:
-                    data = f.read()
-                self._stats = [None] * expected_cnt
-                bio, idx = io.BytesIO(data), 0
-                while bio.tell() < len(data):
-                    try:
-                        kills, _ = leb128.i.decode_reader(bio)
-                        losses, _ = leb128.i.decode_reader(bio)
-                        self._stats[idx] = None if kills == 0 and losses == 0 else (
-                            kills, losses)
-                        idx += 1
-                    except:
-                        break
-                logger.info(f"  Stats loaded: {idx:,} total")
-                logger.info("  Saving stats cache...")
-                with open(stats_pkl_path, 'wb') as f:
-                    pickle.dump(self._stats, f,
-                                protocol=pickle.HIGHEST_PROTOCOL)
-
-        if mappings_path.exists():
-            logger.info("  Loading precomputed mappings...")
-            with open(mappings_path, 'rb') as f:
-                mappings = pickle.load(f)
-            self._name2tid = mappings['name2tid']
-            self._tid2name = mappings['tid2name']
-            self._corp_id_to_name = mappings['corp_id_to_name']
-            self._alliance_id_to_name = mappings['alliance_id_to_name']
-            logger.info(f"  Mappings loaded: {len(self._name2tid):,} entries")
-        elif self._name2tid is None and self._trie:
-            logger.info("  Building name mappings (first run)...")
-            self._name2tid = {}
-            self._tid2name = {}
-            self._corp_id_to_name = {}
-            self._alliance_id_to_name = {}
-            for tid in range(len(self._trie)):
-                name = self._trie.restore_key(tid)
-                self._name2tid[name] = tid
-                self._tid2name[tid] = name
-                if name.startswith('#'):
-                    self._corp_id_to_name[self._tid2id[tid]] = name[1:]
-                elif name.startswith('@'):
-                    self._alliance_id_to_name[self._tid2id[tid]] = name[1:]
-            logger.info(
-                f"  Name mappings built: {len(self._name2tid):,} total")
-            logger.info("  Saving mappings for faster future loads...")
-            mappings = {
-                'name2tid': self._name2tid,
-                'tid2name': self._tid2name,
-                'corp_id_to_name': self._corp_id_to_name,
-                'alliance_id_to_name': self._alliance_id_to_name
-            }
-            with open(mappings_path, 'wb') as f:
-                pickle.dump(mappings, f, protocol=pickle.HIGHEST_PROTOCOL)
+    def _mark_lookup(self):
+        if self.first_lookup_ms is None:
+            self.first_lookup_ms = (time.perf_counter() - self._start_time) * 1000
+            logger.info(f"First cache lookup served {self.first_lookup_ms:.1f} ms after start")
 
-        self._cache_loaded = True
-        logger.info("Cache loading complete")
+    def _map_column(self, col, expected_cnt):
+        _, col_name, width = COLUMNS[col]
+        if self._bundle is None or not self._bundle.has(col_name):
+            return None
+        if not self._bundle.verify(col_name, expected_cnt, width * COL_DTYPE.itemsize):
+            return None
+
+        arr = np.memmap(self._bundle.file(col_name), dtype=COL_DTYPE, mode='r')
+        if width > 1:
+            arr = arr.reshape(-1, width)
+        logger.info(f"  {col_name} mapped: {len(arr):,} entries")
+        return arr
+
+    def _map_id_index(self):
+        bundle = self._bundle
+        if bundle is None or self._trie is None or self._tid2id is None:
+            return None
+        if not bundle.has(ID_INDEX):
+            return None
+        count = bundle.manifest['files'][ID_INDEX]['count']
+        if not bundle.verify(ID_INDEX, count, 2 * COL_DTYPE.itemsize):
+            return None
+
+        index = np.asarray(np.memmap(bundle.file(ID_INDEX), dtype=COL_DTYPE, mode='r')).reshape(2, -1)
+        if index.shape[1] and int(index[1].max()) >= len(self._trie):
+            logger.warning(f"  {ID_INDEX} references unknown trie ids; ignoring")
+            return None
+        logger.info(f"  {ID_INDEX} mapped: {index.shape[1]:,} entries")
+        return index[0], index[1]
+
+    def _build_id_index(self, tid2id):
+        ids = np.asarray(tid2id, dtype=COL_DTYPE)
+        tids = np.flatnonzero(ids)
+        order = tids[np.argsort(ids[tids], kind='stable')]
+        return np.stack((ids[order], order.astype(COL_DTYPE)))
+
+    def _map_folded_index(self):
+        bundle, trie = self._bundle, self._trie
+        if bundle is None or trie is None:
+            return None
+        if not bundle.verify(FOLDED_INDEX, len(trie), 2 * COL_DTYPE.itemsize):
+            return None
+        # Plain ndarray views of the mapping: np.memmap slicing overhead
+        # would dominate single-name lookups.
+        index = np.asarray(np.memmap(bundle.file(FOLDED_INDEX), dtype=COL_DTYPE, mode='r')).reshape(2, -1)
+        logger.info(f"  {FOLDED_INDEX} mapped: {index.shape[1]:,} entries")
+        return index[0], index[1]
+
+    def _build_folded_index(self, trie):
+        hashes = np.zeros(len(trie), dtype=COL_DTYPE)
+        for key, tid in trie.iteritems():
+            hashes[tid] = _fold_hash(key)
+        order = np.argsort(hashes, kind='stable')
+        return np.stack((hashes[order], order.astype(COL_DTYPE)))
+
+    def _get_folded_tid(self, name):
+        self._ensure('folded')
+        if self._folded is None:
+            return None
+        hashes, tids = self._folded
+        # Same dtype as the index, or searchsorted casts the whole row.
+        h = COL_DTYPE.type(_fold_hash(name))
+        lo = int(hashes.searchsorted(h))
+        folded = name.casefold()
+        for tid in tids[lo:int(hashes.searchsorted(h, 'right'))].tolist():
+            if self._trie.restore_key(tid).casefold() == folded:
+                return tid
+        return None
+
+    def _lookup_keys(self, entity_ids):
+        """Trie keys for ``entity_ids`` with one vectorized binary search.
+        Ids the base bundle knows under several keys map to all of them."""
+        self._ensure('id_index')
+        if self._id_index is None:
+            return {}
+        query = np.fromiter((i for i in set(entity_ids) if i and 0 < i < _MAX_ID), dtype=COL_DTYPE)
+        if not len(query):
+            return {}
+        ids, tids = self._id_index
+        lo, hi = ids.searchsorted(query), ids.searchsorted(query, 'right')
+        found = np.flatnonzero(hi > lo)
+        res = {}
+        for entity_id, start, end in zip(query[found].tolist(), lo[found].tolist(), hi[found].tolist()):
+            res[entity_id] = [self._trie.restore_key(t) for t in tids[start:end].tolist()]
+        return res
+
+    def _lookup_entity_name(self, entity_id, prefix):
+        for key in self._lookup_keys([entity_id]).get(entity_id, ()):
+            if key[0] == prefix:
+                return key[1:]
+        return None
+
+    def get_corp_name(self, corp_id):
+        self._ensure('overlay')
+        return self._overlay.corps.get(corp_id) or self._lookup_entity_name(corp_id, '#')
+
+    def get_alliance_name(self, alliance_id):
+        self._ensure('overlay')
+        return self._overlay.alliances.get(alliance_id) or self._lookup_entity_name(alliance_id, '@')
+
+    def get_name_by_id(self, entity_id):
+        """Name of a character, corporation or alliance by id."""
+        return self.get_names_by_ids_batch([entity_id]).get(entity_id)
+
+    def get_names_by_ids_batch(self, entity_ids):
+        """Names of characters, corporations and alliances by id, overlay
+        first; ids the cache doesn't know are left out."""
+        self._ensure('overlay')
+        overlay = self._overlay
+        res, rest = {}, []
+        for entity_id in entity_ids:
+            name = overlay.char_names.get(entity_id) or overlay.corps.get(entity_id) or \
+                overlay.alliances.get(entity_id)
+            if name:
+                res[entity_id] = name
+            else:
+                rest.append(entity_id)
+        for entity_id, keys in self._lookup_keys(rest).items():
+            key = keys[0]
+            res[entity_id] = key[1:] if key[0] in ENTITY_PREFIXES else key
+        return res
 
     def get_tid(self, name):
-        return self._name2tid.get(name)
+        """Trie id of ``name``; falls back to a case-insensitive match."""
+        self._ensure('trie')
+        if not self._trie:
+            return None
+        tid = self._trie.get(name)
+        return tid if tid is not None else self._get_folded_tid(name)
 
     def get_id_by_tid(self, trie_id):
-        if self._tid2id and 0 <= trie_id < len(self._tid2id):
-            return self._tid2id[trie_id]
+        self._ensure('ids')
+        if self._tid2id is not None and 0 <= trie_id < len(self._tid2id):
+            return int(self._tid2id[trie_id])
         return None
 
     def get_names_by_tids_batch(self, trie_ids):
-        if not self._tid2name:
+        self._ensure('trie')
+        if not self._trie:
             return {}
-        return {tid: self._tid2name[tid] for tid in trie_ids if tid in self._tid2name}
+        n = len(self._trie)
+        return {tid: self._trie.restore_key(tid) for tid in trie_ids if 0 <= tid < n}
 
     def get_ids_by_tids_batch(self, trie_ids):
-        if not self._tid2id:
+        self._ensure('ids')
+        if self._tid2id is None:
             return {}
-        return {tid: self._tid2id[tid]
-                for tid in trie_ids
-                if 0 <= tid < len(self._tid2id)}
+        n = len(self._tid2id)
+        tids = [tid for tid in trie_ids if 0 <= tid < n]
+        return dict(zip(tids, self._tid2id[tids].tolist()))
 
     def get_tids_batch(self, names):
-        if not self._name2tid:
+        self._ensure('trie')
+        if not self._trie:
             return {}
-        return {name: self._name2tid[name] for name in names if name in self._name2tid}
+        trie = self._trie
+        res = {}
+        for name in names:
+            tid = trie.get(name)
+            if tid is None:
+                tid = self._get_folded_tid(name)
+            if tid is not None:
+                res[name] = tid
+        return res
 
     def build_cache(self, chars_file='test_data/char_data/extracted_characters_active.json',
-                    corps_alliances_file='test_data/char_data/corps_alliances_with_names.json'):
-
-        logger.info("Loading character data...")
-        with open(chars_file, 'r', encoding='utf-8') as f:
-            char_data = json.load(f)
+                    corps_alliances_file='test_data/char_data/corps_alliances_with_names.json',
+                    batch_size=BUILD_BATCH):
+        """Build a bundle from the extracted characters file in two streaming
+        passes: the first feeds names straight into the trie, the second remaps
+        ids and corp/alliance pairs into trie order a batch at a time. Neither
+        the records nor the names are ever held as python lists."""
 
         logger.info("Loading corp/alliance data...")
         with open(corps_alliances_file, 'r', encoding='utf-8') as f:
             corp_ally_data = json.load(f)
 
-        names = []
-        ids_data = []
-        char_info_data = []
-        corp_id_to_name = {}
-        alliance_id_to_name = {}
+        logger.info("Building trie...")
+        entries = self._iter_build_entries(chars_file, corp_ally_data)
+        trie = marisa_trie.Trie(name for name, _, _, _ in tqdm(entries, desc="Building trie"))
+
+        logger.info("Remapping columns...")
+        ordered_ids = np.zeros(len(trie), dtype=COL_DTYPE)
+        ordered_char_info = np.zeros((len(trie), 2), dtype=COL_DTYPE)
+        entries = self._iter_build_entries(chars_file, corp_ally_data)
+        names_cnt = 0
+        pbar = tqdm(total=len(trie), desc="Remapping columns")
+        while batch := list(islice(entries, batch_size)):
+            tids = np.fromiter((trie.key_id(e[0]) for e in batch), dtype=np.int64, count=len(batch))
+            vals = np.array([e[1:] for e in batch], dtype=COL_DTYPE)
+            ordered_ids[tids] = vals[:, 0]
+            ordered_char_info[tids] = vals[:, 1:]
+            names_cnt += len(batch)
+            pbar.update(len(batch))
+        pbar.close()
+
+        logger.info("Writing bundle...")
+        columns = {
+            COLUMNS['ids'][1]: (ordered_ids, len(trie)),
+            COLUMNS['char_info'][1]: (ordered_char_info, len(trie)),
+        }
+        index = self._build_id_index(ordered_ids)
+        columns[ID_INDEX] = (index, index.shape[1])
+        folded = self._build_folded_index(trie)
+        columns[FOLDED_INDEX] = (folded, folded.shape[1])
+        sources = {Path(fpath).name: describe_source(fpath)
+                   for fpath in (chars_file, corps_alliances_file)}
+        bundle = write_bundle(self.cache_dir, trie, columns, sources)
+
+        logger.info(f"Built cache with {names_cnt} entries")
+        logger.info(f"Cache saved to {bundle.path}")
 
-        logger.info(f"Processing {len(char_data)} characters...")
-        for entry in tqdm(char_data, desc="Processing characters"):
+        return trie
+
+    def _iter_build_entries(self, chars_file, corp_ally_data):
+        for entry in iter_records(chars_file):
             char_name = entry.get('name')
             char_id = entry.get('character_id')
             if char_name and char_id:
-                names.append(char_name)
-                ids_data.append(char_id)
-                corp_id = entry.get('corporation_id') or 0
-                alliance_id = entry.get('alliance_id') or 0
-                char_info_data.append((corp_id, alliance_id))
-
-        logger.info(
-            f"Processing {len(corp_ally_data['corporations'])} corporations...")
-        for corp_id, corp_name in tqdm(corp_ally_data['corporations'].items(), desc="Processing corporations"):
-            if corp_name and corp_name != 'Unknown':
-                corp_id_to_name[int(corp_id)] = corp_name
-                names.append(f"#{corp_name}")
-                ids_data.append(int(corp_id))
-                char_info_data.append((0, 0))
-
-        logger.info(
-            f"Processing {len(corp_ally_data['alliances'])} alliances...")
-        for alliance_id, alliance_name in tqdm(corp_ally_data['alliances'].items(), desc="Processing alliances"):
-            if alliance_name and alliance_name != 'Unknown':
-                alliance_id_to_name[int(alliance_id)] = alliance_name
-                names.append(f"@{alliance_name}")
-                ids_data.append(int(alliance_id))
-                char_info_data.append((0, 0))
-
-        self._corp_id_to_name = corp_id_to_name
-        self._alliance_id_to_name = alliance_id_to_name
+                yield (char_name, char_id,
+                       entry.get('corporation_id') or 0, entry.get('alliance_id') or 0)
 
-        logger.info("Building trie...")
-        trie = marisa_trie.Trie(names)
-
-        logger.info("Creating binary data...")
-        ordered_ids = [None] * len(trie)
-        ordered_char_info = [None] * len(trie)
-        for i, (id_val, char_info) in enumerate(tqdm(zip(ids_data, char_info_data), desc="Ordering data", total=len(ids_data))):
-            name = names[i]
-            trie_id = trie[name]
-            ordered_ids[trie_id] = id_val
-            ordered_char_info[trie_id] = char_info
-
-        logger.info("Writing files...")
-        trie_path = self.cache_dir / 'names.pkl'
-        ids_path = self.cache_dir / 'ids.bin'
-        char_info_path = self.cache_dir / 'char_info.bin'
-
-        self.save_trie_pickle(trie, trie_path)
-
-        with open(ids_path, 'wb') as f:
-            for id_val in tqdm(ordered_ids, desc="Writing IDs"):
-                f.write(leb128.i.encode(id_val))
-
-        with open(char_info_path, 'wb') as f:
-            for char_info in tqdm(ordered_char_info, desc="Writing char info"):
-                corp_id, alliance_id = char_info
-                f.write(leb128.i.encode(corp_id))
-                f.write(leb128.i.encode(alliance_id))
-
-        logger.info(f"Built cache with {len(names)} entries")
-        logger.info(
-            f"Cache saved to {trie_path}, {ids_path}, {char_info_path}")
+        for corp_id, corp_name in corp_ally_data['corporations'].items():
+            if corp_name and corp_name != 'Unknown':
+                yield f"#{corp_name}", int(corp_id), 0, 0
 
-        return trie
+        for alliance_id, alliance_name in corp_ally_data['alliances'].items():
+            if alliance_name and alliance_name != 'Unknown':
+                yield f"@{alliance_name}", int(alliance_id), 0, 0
 
     def test_cache(self, chars_file='test_data/char_data/extracted_characters_active.json',
                    corps_alliances_file='corps_alliances_with_names.json'):
         logger.info("Testing cache...")
 
-        with open(chars_file, 'r', encoding='utf-8') as f:
-            char_data = json.load(f)
+        char_data = list(islice(iter_records(chars_file), 1000))
 
         with open(corps_alliances_file, 'r', encoding='utf-8') as f:
             corp_ally_data = json.load(f)
 
-        if not self._trie or not self._tid2id:
+        if not self._trie or self._tid2id is None:
             logger.error("Cache not loaded properly")
             return False
 
         errors = 0
         total_tested = 0
 
-        for entry in char_data[:1000]:
+        for entry in char_data:
             char_name = entry.get('name')
             char_id = entry.get('character_id')
             if char_name and char_id:
@@ -336,25 +514,38 @@ class CacheManager:
         logger.info(f"Tested {total_tested} entries, {errors} errors")
         return errors == 0
 
-    def get_char_info(self, char_name):
-
+    def _canonical_tid(self, char_name):
+        """Trie id and stored spelling of ``char_name``."""
         tid = self.get_tid(char_name)
         if tid is None:
-            return None
+            return None, None
+        return tid, (char_name if char_name in self._trie else self._trie.restore_key(tid))
 
-        char_id = self.get_id_by_tid(tid)
-        if char_id is None:
-            return None
-
-        if not self._char_info or tid >= len(self._char_info) or self._char_info[tid] is None:
+    def get_char_info(self, char_name):
+        self._ensure('overlay')
+        entry = self._overlay.chars.get(self._overlay.canonical(char_name))
+        if entry:
+            char_id, corp_id, alliance_id = entry
+        else:
+            tid, name = self._canonical_tid(char_name)
+            if tid is None:
+                return None
+
+            char_id = self.get_id_by_tid(tid)
+            if char_id is None or self._overlay.is_renamed(name, char_id):
+                return None
+
+            self._ensure('char_info')
+            if self._char_info is None or tid >= len(self._char_info):
+                return None
+            corp_id, alliance_id = self._char_info[tid].tolist()
+
+        if corp_id == 0:
             return None
 
-        corp_id, alliance_id = self._char_info[tid]
-
-        corp_name = self._corp_id_to_name.get(
-            corp_id, 'Unknown') if corp_id else 'Unknown'
-        alliance_name = self._alliance_id_to_name.get(
-            alliance_id) if alliance_id else None
+        corp_name = self.get_corp_name(corp_id) or 'Unknown'
+        alliance_name = self.get_alliance_name(alliance_id)
+        self._mark_lookup()
 
         return {
             'char_id': char_id,
@@ -365,20 +556,119 @@ class CacheManager:
         }
 
     def get_char_stats(self, char_name):
-        tid = self.get_tid(char_name)
+        self._ensure('overlay')
+        entry = self._overlay.chars.get(self._overlay.canonical(char_name))
+        if entry:
+            return self._overlay.get_stats(entry[0])
+        tid, name = self._canonical_tid(char_name)
         if tid is None:
             return None
-        if not self._stats or tid >= len(self._stats) or self._stats[tid] is None:
-            return None
-        kills, losses = self._stats[tid]
-        return {'kills': kills, 'losses': losses}
+        char_id = self.get_id_by_tid(tid)
+        if char_id is not None:
+            if self._overlay.is_renamed(name, char_id):
+                return None
+            if char_id in self._overlay.stats:
+                return self._overlay.get_stats(char_id)
+        return self.get_stats_by_tid(tid)
 
     def get_stats_by_tid(self, tid):
-        if not self._stats or tid >= len(self._stats) or self._stats[tid] is None:
+        self._ensure('stats')
+        if self._stats is None or tid >= len(self._stats):
+            return None
+        kills, losses = self._stats[tid].tolist()
+        if kills == 0 and losses == 0:
             return None
-        kills, losses = self._stats[tid]
         return {'kills': kills, 'losses': losses}
 
+    def apply_delta(self, delta_file):
+        """Store a delta file as a new overlay segment of the current bundle.
+        Lookups in this process see it immediately, other processes on their
+        next start."""
+        self._ensure('overlay')
+        if self._bundle is None:
+            logger.error("No cache bundle to apply a delta to")
+            return None
+        with self._load_lock:
+            return write_segment(overlay_dir(self.cache_dir, self._bundle.path.name),
+                                 self._overlay, delta_file)
+
+    def compact(self):
+        """Merge the overlay segments into a new base bundle."""
+        self.load_cache()
+        overlay, base = self._overlay, self._trie
+        if not overlay or base is None or self._tid2id is None:
+            logger.info("Nothing to compact")
+            return None
+
+        logger.info(f"Compacting {len(overlay.segments)} overlay segments into a new bundle...")
+        base_ids = np.asarray(self._tid2id)
+
+        # Base entries whose id now lives under another name are dropped.
+        cur_names = dict(overlay.char_names)
+        cur_names.update({i: f"#{n}" for i, n in overlay.corps.items()})
+        cur_names.update({i: f"@{n}" for i, n in overlay.alliances.items()})
+        cand = np.flatnonzero(np.isin(base_ids, np.fromiter(cur_names, dtype=np.int64)))
+        drop = [t for t in cand.tolist() if base.restore_key(t) != cur_names[int(base_ids[t])]]
+        keep = np.setdiff1d(np.arange(len(base)), drop)
+
+        new_keys = chain(overlay.chars, (f"#{n}" for n in overlay.corps.values()),
+                         (f"@{n}" for n in overlay.alliances.values()))
+        trie = marisa_trie.Trie(chain((base.restore_key(t) for t in keep.tolist()), new_keys))
+
+        new_tids = np.fromiter((trie.key_id(base.restore_key(t)) for t in keep.tolist()),
+                               dtype=np.int64, count=len(keep))
+        ids = np.zeros(len(trie), dtype=COL_DTYPE)
+        char_info = np.zeros((len(trie), 2), dtype=COL_DTYPE)
+        ids[new_tids] = base_ids[keep]
+        if self._char_info is not None:
+            char_info[new_tids] = self._char_info[keep]
+        stats = None
+        if self._stats is not None or overlay.stats:
+            stats = np.zeros((len(trie), 2), dtype=COL_DTYPE)
+            if self._stats is not None:
+                stats[new_tids] = self._stats[keep]
+
+        for name, (char_id, corp_id, alliance_id) in overlay.chars.items():
+            tid = trie.key_id(name)
+            ids[tid] = char_id
+            char_info[tid] = (corp_id, alliance_id)
+        for prefix, names in (('#', overlay.corps), ('@', overlay.alliances)):
+            for entity_id, name in names.items():
+                tid = trie.key_id(f"{prefix}{name}")
+                ids[tid] = entity_id
+                char_info[tid] = (0, 0)
+        if overlay.stats:
+            rows = np.flatnonzero(np.isin(ids, np.fromiter(overlay.stats, dtype=np.int64)))
+            for row in rows.tolist():
+                stats[row] = overlay.stats[int(ids[row])]
+
+        columns = {
+            COLUMNS['ids'][1]: (ids, len(trie)),
+            COLUMNS['char_info'][1]: (char_info, len(trie)),
+        }
+        if stats is not None:
+            columns[COLUMNS['stats'][1]] = (stats, len(trie))
+        index = self._build_id_index(ids)
+        columns[ID_INDEX] = (index, index.shape[1])
+        folded = self._build_folded_index(trie)
+        columns[FOLDED_INDEX] = (folded, folded.shape[1])
+        sources = dict(self._bundle.sources)
+        sources.update({seg.name: describe_source(seg) for seg in overlay.segments})
+
+        old_overlays = overlay_dir(self.cache_dir, self._bundle.path.name)
+        bundle = write_bundle(self.cache_dir, trie, columns, sources)
+        shutil.rmtree(old_overlays, ignore_errors=True)
+        logger.info(f"Compacted: {len(base):,} -> {len(trie):,} entries, {len(drop):,} renamed away")
+        self._reset()
+        return bundle
+
+    def _reset(self):
+        with self._load_lock:
+            self._trie = self._tid2id = self._char_info = self._stats = None
+            self._id_index = self._folded = self._overlay = self._bundle = None
+            self._loaded.clear()
+            self._cache_loaded = False
+
     def save_trie_pickle(self, trie, fpath):
         with open(fpath, 'wb') as f:
             pickle.dump(trie, f)
@@ -388,15 +678,73 @@ class CacheManager:
             return pickle.load(f)
 
 
+def _fold_hash(name):
+    return zlib.crc32(name.casefold().encode('utf-8'))
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass
+    # Windows: PeakWorkingSetSize from GetProcessMemoryInfo.
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    try:
+        kernel32 = ctypes.windll.kernel32
+        psapi = ctypes.windll.psapi
+    except AttributeError:
+        return None
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize / 1024 / 1024
+
+
 if __name__ == "__main__":
-    cache = CacheManager()
-    cache.build_cache()
-    cache.load_cache()
-
-    for name in ("Some Pilot", "Another Pilot"):
-        info = cache.get_char_info(name)
-        if info:
-            logger.info(f"Char ID: {info['char_id']}")
-            logger.info(f"Corp: {info['corp_name']} ({info['corp_id']})")
-            logger.info(
-                f"Alliance: {info['alliance_name']} ({info['alliance_id']})")
+    import argparse
+    parser = argparse.ArgumentParser(description="Build and maintain the character cache bundle")
+    parser.add_argument('--cache-dir', default='cache')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    build_p = sub.add_parser('build', help="build a new bundle from extracted character data")
+    build_p.add_argument('--chars', default='test_data/char_data/extracted_characters_active.json',
+                         help="JSON array or NDJSON of extracted characters")
+    build_p.add_argument('--corps-alliances', default='test_data/char_data/corps_alliances_with_names.json')
+    build_p.add_argument('--batch-size', type=int, default=BUILD_BATCH)
+    delta_p = sub.add_parser('apply-delta', help="add a delta file as an overlay segment")
+    delta_p.add_argument('delta_file')
+    sub.add_parser('compact', help="merge overlay segments into a new bundle")
+    args = parser.parse_args()
+
+    cache = CacheManager(args.cache_dir)
+    if args.cmd == 'build':
+        start = time.perf_counter()
+        trie = cache.build_cache(args.chars, args.corps_alliances, args.batch_size)
+        dur = time.perf_counter() - start
+        peak = _peak_rss_mb()
+        logger.info(f"Built {len(trie):,} entries in {dur:.1f}s ({len(trie) / dur:,.0f} entries/s)"
+                    + (f", peak RSS {peak:,.0f} MB" if peak is not None else ""))
+    elif args.cmd == 'apply-delta':
+        cache.apply_delta(args.delta_file)
+    elif args.cmd == 'compact':
+        cache.compact()
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+# Bumped whenever the layout of any bundle file changes. Bundles with a
+# different version are never mapped, only converted from.
+# 2: id_index.u32 and folded.u32 replace corps.u32/alliances.u32.
+FORMAT_VERSION = 2
+MANIFEST = 'manifest.json'
+CURRENT = 'CURRENT'
+BUNDLES_DIR = 'bundles'
+# How long a replaced bundle is kept for processes that still have it open.
+REPLACED_TTL = 24 * 3600
+
+
+def file_sha256(fpath) -> str:
+    h = hashlib.sha256()
+    with open(fpath, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def describe_source(fpath) -> Dict:
+    st = os.stat(fpath)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': file_sha256(fpath)}
+
+
+def source_changed(fpath, rec: Optional[Dict], built_at: float) -> bool:
+    st = os.stat(fpath)
+    if rec is None:
+        # Not an input of this bundle; only newer drops should replace it.
+        return st.st_mtime > built_at
+    if st.st_size == rec['size'] and st.st_mtime_ns == rec['mtime_ns']:
+        return False
+    return file_sha256(fpath) != rec['sha256']
+
+
+class Bundle:
+    def __init__(self, path: Path, manifest: Dict):
+        self.path = path
+        self.manifest = manifest
+
+    @property
+    def entry_count(self) -> int:
+        return self.manifest['entry_count']
+
+    @property
+    def built_at(self) -> float:
+        return self.manifest['built_at']
+
+    @property
+    def format_version(self):
+        return self.manifest.get('format_version')
+
+    @property
+    def current(self) -> bool:
+        return self.format_version == FORMAT_VERSION
+
+    @property
+    def sources(self) -> Dict:
+        return self.manifest.get('sources', {})
+
+    def file(self, name: str) -> Path:
+        return self.path / name
+
+    def has(self, name: str) -> bool:
+        return name in self.manifest['files'] and self.file(name).exists()
+
+    def verify(self, name: str, count: int, row_bytes: int = None) -> bool:
+        rec = self.manifest['files'].get(name)
+        fpath = self.file(name)
+        if rec is None or not fpath.exists():
+            return False
+        if rec['count'] != count:
+            logger.warning(f"  {name}: manifest count {rec['count']:,} != {count:,}; rejecting")
+            return False
+        if row_bytes is not None and fpath.stat().st_size != count * row_bytes:
+            logger.warning(f"  {name}: size {fpath.stat().st_size:,} does not match {count:,} rows; rejecting")
+            return False
+        if file_sha256(fpath) != rec['sha256']:
+            logger.warning(f"  {name}: checksum mismatch; rejecting")
+            return False
+        return True
+
+
+def open_current(cache_dir: Path, any_format: bool = False) -> Optional[Bundle]:
+    """The bundle CURRENT points at. Bundles of another format version are
+    only returned with ``any_format``, as a source for converting."""
+    ptr = cache_dir / CURRENT
+    if not ptr.exists():
+        return None
+    try:
+        path = cache_dir / BUNDLES_DIR / ptr.read_text().strip()
+        with open(path / MANIFEST, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Cache bundle unreadable: {e}")
+        return None
+    bundle = Bundle(path, manifest)
+    if not bundle.current and not any_format:
+        logger.info(f"Cache bundle format {bundle.format_version} != {FORMAT_VERSION}; ignoring")
+        return None
+    return bundle
+
+
+def write_bundle(cache_dir: Path, trie, columns: Dict[str, Tuple[object, int]],
+                 sources: Dict[str, Dict]) -> Bundle:
+    """Write trie + columns into a fresh bundle and make it current.
+
+    Everything is written into a temp dir first, which is renamed into place
+    and then published by atomically replacing the CURRENT pointer, so readers
+    only ever see complete bundles.
+    """
+    bundles = cache_dir / BUNDLES_DIR
+    bundles.mkdir(parents=True, exist_ok=True)
+    build_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{time.monotonic_ns() % 1000000:06d}"
+    tmp = bundles / f'.tmp-{build_id}'
+    tmp.mkdir()
+
+    files = {}
+    trie.save(str(tmp / 'names.trie'))
+    files['names.trie'] = {'count': len(trie), 'sha256': file_sha256(tmp / 'names.trie')}
+    for name, (arr, count) in columns.items():
+        arr.tofile(tmp / name)
+        files[name] = {'count': count, 'sha256': file_sha256(tmp / name)}
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'entry_count': len(trie),
+        'built_at': time.time(),
+        'sources': sources,
+        'files': files,
+    }
+    with open(tmp / MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    final = bundles / build_id
+    os.rename(tmp, final)
+    ptr_tmp = cache_dir / f'{CURRENT}.{build_id}.tmp'
+    ptr_tmp.write_text(build_id)
+    os.replace(ptr_tmp, cache_dir / CURRENT)
+    logger.info(f"Cache bundle {build_id} published ({len(trie):,} entries)")
+
+    _remove_old_bundles(bundles, keep=build_id)
+    return Bundle(final, manifest)
+
+
+def _remove_old_bundles(bundles: Path, keep: str):
+    # Other processes may still be loading a replaced bundle, so the previous
+    # one is always kept and older ones only go once they have been replaced
+    # for REPLACED_TTL. On Windows files still mapped can't be removed yet and
+    # are retried on the next build. Temp dirs of concurrent builds are left
+    # alone unless clearly abandoned.
+    now = time.time()
+    built = []
+    for path in bundles.iterdir():
+        if not path.is_dir():
+            continue
+        if path.name.startswith('.tmp-'):
+            if now - path.stat().st_mtime >= 3600:
+                shutil.rmtree(path, ignore_errors=True)
+            continue
+        built.append((path.stat().st_mtime, path))
+    built.sort(reverse=True)
+    # A bundle was replaced no later than the next newer one was built.
+    for (replaced_at, _), (_, path) in zip(built[1:], built[2:]):
+        if path.name != keep and now - replaced_at >= REPLACED_TTL:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+from stream_json import iter_records
+
+OVERLAYS_DIR = 'overlays'
+SEGMENT_GLOB = 'seg-*.ndjson'
+
+
+class CacheOverlay:
+    """Small in-memory layer of delta records on top of a base bundle.
+
+    Delta records (JSON array or NDJSON) look like::
+
+        {"type": "character", "name": ..., "character_id": ..., "corporation_id": ..., "alliance_id": ...}
+        {"type": "corporation", "id": ..., "name": ...}
+        {"type": "alliance", "id": ..., "name": ...}
+        {"type": "stats", "character_id": ..., "kills": ..., "losses": ...}
+
+    A record without ``type`` is read as a character, so extracted character
+    files can be used as deltas directly. A character record whose id is
+    already known under another name is a rename; the old name stops
+    resolving.
+    """
+
+    def __init__(self):
+        self.chars: Dict[str, Tuple[int, int, int]] = {}
+        self.folded: Dict[str, str] = {}
+        self.char_names: Dict[int, str] = {}
+        self.corps: Dict[int, str] = {}
+        self.alliances: Dict[int, str] = {}
+        self.stats: Dict[int, Tuple[int, int]] = {}
+        self.segments = []
+
+    def __len__(self):
+        return len(self.chars) + len(self.corps) + len(self.alliances) + len(self.stats)
+
+    def apply(self, rec: Dict) -> bool:
+        kind = rec.get('type', 'character')
+        if kind == 'character':
+            name, char_id = rec.get('name'), rec.get('character_id')
+            if not name or not char_id:
+                return False
+            old = self.char_names.get(char_id)
+            if old is not None and old != name:
+                self.chars.pop(old, None)
+                if self.folded.get(old.casefold()) == old:
+                    del self.folded[old.casefold()]
+            self.chars[name] = (char_id, rec.get('corporation_id') or 0, rec.get('alliance_id') or 0)
+            self.folded[name.casefold()] = name
+            self.char_names[char_id] = name
+        elif kind in ('corporation', 'alliance'):
+            entity_id, name = rec.get('id'), rec.get('name')
+            if not entity_id or not name:
+                return False
+            (self.corps if kind == 'corporation' else self.alliances)[entity_id] = name
+        elif kind == 'stats':
+            char_id = rec.get('character_id')
+            if not char_id:
+                return False
+            self.stats[char_id] = (rec.get('kills') or 0, rec.get('losses') or 0)
+        else:
+            return False
+        return True
+
+    def canonical(self, name: str) -> Optional[str]:
+        """The overlay's spelling of a character name, matched case-insensitively."""
+        return name if name in self.chars else self.folded.get(name.casefold())
+
+    def is_renamed(self, name: str, char_id: int) -> bool:
+        cur = self.char_names.get(char_id)
+        return cur is not None and cur != name
+
+    def get_stats(self, char_id: int) -> Optional[Dict]:
+        s = self.stats.get(char_id)
+        return {'kills': s[0], 'losses': s[1]} if s else None
+
+
+def overlay_dir(cache_dir: Path, bundle_id: str) -> Path:
+    return cache_dir / OVERLAYS_DIR / bundle_id
+
+
+def load_overlay(seg_dir: Path) -> CacheOverlay:
+    overlay = CacheOverlay()
+    if not seg_dir.exists():
+        return overlay
+    for seg in sorted(seg_dir.glob(SEGMENT_GLOB)):
+        for rec in iter_records(seg):
+            overlay.apply(rec)
+        overlay.segments.append(seg)
+    if overlay.segments:
+        logger.info(f"  Overlay: {len(overlay.segments)} segments, {len(overlay):,} records")
+    return overlay
+
+
+def write_segment(seg_dir: Path, overlay: CacheOverlay, delta_file) -> Path:
+    """Validate a delta file, apply it to ``overlay`` and persist the accepted
+    records as a new segment (written to a temp file and renamed in)."""
+    seg_dir.mkdir(parents=True, exist_ok=True)
+    seg_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{time.monotonic_ns() % 1000000:06d}"
+    tmp = seg_dir / f'.seg-{seg_id}.tmp'
+    accepted = skipped = 0
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for rec in iter_records(delta_file):
+            if overlay.apply(rec):
+                f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+                accepted += 1
+            else:
+                skipped += 1
+    seg = seg_dir / f'seg-{seg_id}.ndjson'
+    os.replace(tmp, seg)
+    overlay.segments.append(seg)
+    logger.info(f"Delta {delta_file}: {accepted:,} records applied, {skipped:,} skipped -> {seg.name}")
+    return seg
@@ -1,15 +1,27 @@
 import aiohttp
 from typing import Dict
+from ttl_cache import TTLCache
+from negative_cache import NegativeCache
 from zkill import StatsInterface, calc_danger
 
 
 class DummyClient:
     def __init__(self):
-        self.cache = {}
+        self.cache = TTLCache(0, name='cache_only_stats')
+        self.misses = NegativeCache(0, 0, 'cache_only_not_found')
     
+    def preload(self, char_ids):
+        pass
+
+    async def preload_async(self, char_ids):
+        pass
+
     def clear_cache(self):
         self.cache.clear()
 
+    def cache_stats(self):
+        return {}
+
 
 class CacheStatsProvider(StatsInterface):
     def __init__(self):
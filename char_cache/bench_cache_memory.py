@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from cache import CacheManager, _peak_rss_mb
+
+
+def rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    # Each mode runs in a fresh process, so growth of the peak is close to
+    # growth of the resident set.
+    return _peak_rss_mb()
+
+
+def materialize_legacy(cache):
+    # What the pickled load path used to keep resident: python lists for every
+    # column plus name2tid/tid2name and the corp/alliance name dicts.
+    trie = cache._trie
+    tid2id = cache._tid2id.tolist()
+    char_info = [None if c == 0 else (c, a) for c, a in cache._char_info.tolist()] \
+        if cache._char_info is not None else None
+    stats = [None if k == 0 and l == 0 else (k, l) for k, l in cache._stats.tolist()] \
+        if cache._stats is not None else None
+    name2tid, tid2name, corps, alliances = {}, {}, {}, {}
+    for tid in range(len(trie)):
+        name = trie.restore_key(tid)
+        name2tid[name] = tid
+        tid2name[tid] = name
+        if name.startswith('#'):
+            corps[tid2id[tid]] = name[1:]
+        elif name.startswith('@'):
+            alliances[tid2id[tid]] = name[1:]
+    return tid2id, char_info, stats, name2tid, tid2name, corps, alliances
+
+
+def run_mode(cache_dir, mode, names):
+    base = rss_mb()
+    t0 = time.perf_counter()
+    cache = CacheManager(cache_dir)
+    cache.load_cache()
+    keep = materialize_legacy(cache) if mode == 'legacy' else None
+    load_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hits = sum(1 for n in names if cache.get_char_info(n))
+    lookup_ms = (time.perf_counter() - t0) * 1000
+    print(f"{mode},{rss_mb() - base:.1f},{load_s:.3f},{lookup_ms:.2f},{hits}")
+    return keep
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident memory of the character cache")
+    parser.add_argument('--cache-dir', default='cache')
+    parser.add_argument('--names', default='test_data/dscan_local_big.txt')
+    parser.add_argument('--mode', choices=['legacy', 'mapped'])
+    args = parser.parse_args()
+
+    names = []
+    if os.path.exists(args.names):
+        with open(args.names, 'r', encoding='utf-8') as f:
+            names = [line.strip() for line in f if line.strip()]
+
+    if args.mode:
+        from loguru import logger
+        logger.remove()
+        run_mode(args.cache_dir, args.mode, names)
+        return
+
+    if rss_mb() is None:
+        print("No way to read resident memory here - install psutil")
+        return
+
+    print(f"Cache: {args.cache_dir}, lookups: {len(names)} names")
+    print(f"{'Mode':<10} {'RSS delta':>12} {'Load':>10} {'Lookups':>10} {'Hits':>6}")
+    for mode in ('legacy', 'mapped'):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--cache-dir', args.cache_dir,
+             '--names', args.names, '--mode', mode],
+            capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1]
+        _, rss, load_s, lookup_ms, hits = out.split(',')
+        print(f"{mode:<10} {float(rss):>9.1f} MB {float(load_s):>8.3f} s {float(lookup_ms):>7.2f} ms {hits:>6}")
+
+
+if __name__ == "__main__":
+    main()
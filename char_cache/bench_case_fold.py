@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from cache import CacheManager, FOLDED_INDEX
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache hit rate with and without case-insensitive lookups")
+    parser.add_argument('--cache-dir', default='cache')
+    parser.add_argument('--names', default='test_data/dscan_local_big.txt')
+    args = parser.parse_args()
+    logger.remove()
+
+    with open(args.names, 'r', encoding='utf-8') as f:
+        names = [line.strip() for line in f if line.strip()]
+
+    cache = CacheManager(args.cache_dir)
+    cache.load_cache()
+    if cache._trie is None:
+        print(f"No cache bundle in {args.cache_dir}")
+        return
+
+    t0 = time.perf_counter()
+    exact = sum(1 for n in names if n in cache._trie)
+    exact_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    folded = sum(1 for n in names if cache.get_tid(n) is not None)
+    folded_ms = (time.perf_counter() - t0) * 1000
+
+    trie_mb = cache._bundle.file('names.trie').stat().st_size / 1024 / 1024
+    index_mb = cache._bundle.file(FOLDED_INDEX).stat().st_size / 1024 / 1024
+    print(f"Cache: {args.cache_dir} ({len(cache._trie):,} entries), lookups: {len(names)} names")
+    print(f"exact         {exact:>6} hits ({exact / len(names):6.1%})  {exact_ms:7.2f} ms")
+    print(f"case-folded   {folded:>6} hits ({folded / len(names):6.1%})  {folded_ms:7.2f} ms")
+    print(f"index size    {index_mb:.1f} MB next to a {trie_mb:.1f} MB trie")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import io
+import os
+import sys
+import time
+import random
+import leb128
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from varint import decode_leb128
+
+N_ENTRIES = 3_000_000
+
+
+def make_synthetic(n):
+    # Roughly what ids.bin looks like: mostly character ids in the 2.1e9 range,
+    # a tail of small corp/alliance ids and a few negative values.
+    rng = random.Random(0)
+    vals = [rng.randint(2_100_000_000, 2_147_000_000) if i % 10 else rng.randint(-1000, 99_000_000)
+            for i in range(n)]
+    return vals, b''.join(leb128.i.encode(v) for v in vals)
+
+
+def decode_loop(data):
+    vals = []
+    bio = io.BytesIO(data)
+    while bio.tell() < len(data):
+        try:
+            val, _ = leb128.i.decode_reader(bio)
+            vals.append(val)
+        except:
+            break
+    return vals
+
+
+def bench(name, fn, data):
+    start = time.perf_counter()
+    res = fn(data)
+    dur = time.perf_counter() - start
+    print(f"{name:<10} {dur:>8.3f} s")
+    return res, dur
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_ENTRIES
+    print(f"Encoding {n:,} synthetic values...")
+    vals, data = make_synthetic(n)
+    print(f"Buffer: {len(data):,} bytes")
+
+    loop_res, loop_s = bench('loop', decode_loop, data)
+    np_res, np_s = bench('numpy', decode_leb128, data)
+
+    assert loop_res == vals
+    assert np.array_equal(np_res, np.asarray(vals, dtype=np.int64))
+    print(f"Speedup: {loop_s / np_s:.1f}x")
@@ -3,6 +3,8 @@ import marisa_trie
 import sys
 import leb128
 import vu128
+sys.path.append('..')
+from stream_json import iter_records
 
 def build_character_trie(data):
     keys_values = []
@@ -110,9 +112,11 @@ def extract_active_characters(data, cutoff_date="2007-07"):
     return active_chars
 
 if __name__ == "__main__":
-    with open('../test_data/char_data/extracted_characters_active.json', 'r', encoding='utf-8') as f:
-        extracted_data = json.load(f)
-    
+    # The runtime cache is built by the streaming CacheManager.build_cache
+    # (python cache.py build --help); the functions above are the older format
+    # experiments and take any iterable of records.
+    extracted_data = iter_records('../test_data/char_data/extracted_characters_active.json')
+
     #build_character_trie(extracted_data)
     build_character_trie_separate(extracted_data)
     #build_character_trie_vu128(extracted_data)
@@ -1,9 +1,12 @@
 import struct
 import orjson
 import leb128
-import io
+import os
+import sys
 from pathlib import Path
 from glob import glob
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from varint import decode_leb128
 
 INPUT_DIR = Path('test_data/ek_batches_stats')
 OUTPUT_DIR = Path('test_data/ek_stats')
@@ -16,13 +19,7 @@ def encode_signed_leb128(val):
 def load_trie_ids():
     ids_path = CACHE_DIR / 'ids.bin'
     with open(ids_path, 'rb') as f:
-        data = f.read()
-
-    tid2id = []
-    bio = io.BytesIO(data)
-    while bio.tell() < len(data):
-        id_val, _ = leb128.i.decode_reader(bio)
-        tid2id.append(id_val)
+        tid2id = decode_leb128(f.read()).tolist()
 
     print(f"Loaded {len(tid2id):,} trie entries")
     return tid2id
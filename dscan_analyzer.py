@@ -8,7 +8,7 @@ from overlay import OverlayManager
 from config import C, dict2attrdict
 from services import PilotService, DScanService, PilotState, PilotAPIClient
 from services.api.client import ServerConfig
-from services.dscan_service import get_dscan_info_url
+from services.dscan_service import DScanInfoLinks
 from pilot_color_classifier import PilotColorClassifier
 import ipc
 from loguru import logger
@@ -54,9 +54,15 @@ class DScanAnalyzer:
                 cache_dir, 
                 dscan_cfg.get('stats_provider', 'zkill'),
                 dscan_cfg.get('rate_limit_retry_delay', 5),
-                dscan_cfg.get('aggregated_mode_threshold', 50)
+                dscan_cfg.get('aggregated_mode_threshold', 50),
+                [e for grp in dscan_cfg.get('groups', {}).values() for e in grp.get('entities', [])],
+                dscan_cfg.get('stats_budget', 200),
+                dscan_cfg.get('stats_deadline', 30)
             )
         self.dscan_svc = DScanService()
+        self.dscan_links = DScanInfoLinks()
+        # dscan.info keys with a link waiting to open once their upload is back.
+        self._pending_opens = set()
         
         bg_color = dscan_cfg.get('bg_color', None)
         transparency = dscan_cfg.get('transparency', 255)
@@ -72,6 +78,9 @@ class DScanAnalyzer:
         )
         self.last_clip = ""
         self.mode = None
+        # Pilot list as of pilot_svc.version; rebuilt only when it moves.
+        self._pilots_version = None
+        self._visible_pilots = []
         self.themes = {}
         self._load_ui_scale()
         
@@ -293,8 +302,7 @@ class DScanAnalyzer:
             if action == "pilot":
                 webbrowser.open(data)
             elif action == "header":
-                if url := get_dscan_info_url(self.last_clip):
-                    webbrowser.open(url)
+                self._open_dscan_info(self.last_clip)
             elif action == "alliance":
                 webbrowser.open(f"https://zkillboard.com/alliance/{data}/")
             elif action == "corp":
@@ -306,6 +314,23 @@ class DScanAnalyzer:
                 self.aggr_toggle_requested = True
             break
 
+    def _open_dscan_info(self, paste):
+        # The upload runs in the background; the link opens once it's back.
+        # Clicks while it's pending don't queue more tabs.
+        key = self.dscan_links.submit(paste)
+        future = self.dscan_links.future(key)
+        if future is not None:
+            if key not in self._pending_opens:
+                self._pending_opens.add(key)
+                future.add_done_callback(lambda f, key=key: self._open_uploaded(key, f))
+        elif url := self.dscan_links.get(key):
+            webbrowser.open(url)
+
+    def _open_uploaded(self, key, future):
+        self._pending_opens.discard(key)
+        if not future.cancelled() and (url := future.result()):
+            webbrowser.open(url)
+
     def _setup_aggr_hotkey(self):
         # Corp mode is toggled from the tray and the header button; only bind a
         # hotkey if one is configured (set hotkey_mode to null to disable).
@@ -324,10 +349,17 @@ class DScanAnalyzer:
         self.aggr_mode_manual = not self.aggr_mode if self.aggr_mode_manual is None else not self.aggr_mode_manual
         return True
 
-    def _add_pilot_header(self, count, remaining):
-        # Count | time, followed by a 1-char button that toggles corp/pilot mode.
+    def _add_pilot_header(self, visible, remaining):
+        # Count (joined/left since the last paste) | time (| stats still
+        # queued), followed by a 1-char button that toggles corp/pilot mode.
+        pending = sum(p.state == PilotState.SEARCHING_STATS for _, p in visible)
+        joined, left = len(self.pilot_svc.joined), len(self.pilot_svc.left)
+        header = f"{len(visible)}"
+        if left or joined < len(visible):
+            header += f" (+{joined} -{left})"
+        header += f" | {remaining:.0f}s" + (f" | stats {pending}" if pending else "")
         with dpg.group(horizontal=True):
-            self.add_item(f"{count} | {remaining:.0f}s", (0, 255, 0), ("header", None))
+            self.add_item(header, (0, 255, 0), ("header", None))
             dpg.add_spacer(width=6)
             mode_char = "C" if self.aggr_mode else "P"
             self.add_item(mode_char, (0, 255, 0), ("mode_toggle", None))
@@ -457,9 +489,12 @@ class DScanAnalyzer:
         if dpg.does_item_exist("dscan_content"):
             dpg.delete_item("dscan_content")
         
-        pilots = self.pilot_svc.get_pilots()
-        visible = [(n, p) for n, p in pilots.items() 
-                   if p.state != PilotState.NOT_FOUND or p.char_id is not None]
+        version = self.pilot_svc.version
+        if version != self._pilots_version:
+            self._visible_pilots = [(n, p) for n, p in self.pilot_svc.get_pilots().items()
+                                    if p.state != PilotState.NOT_FOUND or p.char_id is not None]
+            self._pilots_version = version
+        visible = self._visible_pilots
         
         pilot_cnt = len(visible)
         auto_aggr = pilot_cnt > self.aggr_threshold
@@ -484,7 +519,7 @@ class DScanAnalyzer:
             return
         
         with dpg.group(tag="pilot_list", parent="main"):
-            self._add_pilot_header(len(visible), remaining)
+            self._add_pilot_header(visible, remaining)
 
             for i, (name, pilot) in enumerate(visible):
                 row_h = dpg.get_text_size(name)[1]
@@ -512,12 +547,11 @@ class DScanAnalyzer:
             return
         
         alliance_cnt, corps_by_alliance, no_alliance_corps, grp_cnt = self._aggregate_pilots(visible)
-        total = len(visible)
         
         sorted_alliances = sorted(alliance_cnt.items(), key=lambda x: (x[0] == "No Alliance", -x[1]))
         
         with dpg.group(tag="aggr_content", parent="main"):
-            self._add_pilot_header(total, remaining)
+            self._add_pilot_header(visible, remaining)
 
             if any(grp_cnt.values()):
                 with dpg.group(horizontal=True):
@@ -3,8 +3,16 @@ import aiohttp
 from loguru import logger
 from typing import Dict, List
 
+from live_cache import LiveCache, NAME_IDS, ID_NAMES, CHAR_INFO, NAME_MISSES, TTLS
+from ttl_cache import TTLCache
+from negative_cache import NegativeCache
+from single_flight import SingleFlight
+from rate_limiter import RATE_LIMITER
+
 
 class ESIClient:
+    base_url = "https://esi.evetech.net/latest"
+
     def __init__(self):
         self.name_cache = {}
         
@@ -49,10 +57,11 @@ class ESIClient:
         if not ids:
             return {}
 
-        url = "https://esi.evetech.net/latest/universe/names/"
+        url = f"{self.base_url}/universe/names/"
 
         try:
-            async with session.post(url, json=ids, timeout=30) as response:
+            async with RATE_LIMITER.slot(url) as slot, session.post(url, json=ids, timeout=30) as response:
+                slot.update(response)
                 if response.status != 200:
                     logger.warning(f"ESI error: {response.status}")
                     return {}
@@ -109,11 +118,12 @@ class ESIClient:
         if not names:
             return {}
 
-        url = "https://esi.evetech.net/latest/universe/ids/"
+        url = f"{self.base_url}/universe/ids/"
         logger.debug(f"Sending {len(names)} names to ESI: {names[:5]}...")
 
         try:
-            async with session.post(url, json=names, timeout=30) as response:
+            async with RATE_LIMITER.slot(url) as slot, session.post(url, json=names, timeout=30) as response:
+                slot.update(response)
                 if response.status != 200:
                     response_text = await response.text()
                     logger.warning(f"ESI error: {response.status} - {response_text}")
@@ -127,44 +137,87 @@ class ESIClient:
 
 
 class ESIResolver:
-    def __init__(self):
-        self.char_cache = {}
-        self.name_cache = {}
-        self.id_name_cache = {}
+    base_url = "https://esi.evetech.net/latest"
+
+    def __init__(self, store: LiveCache = None, max_size: int = 100_000):
+        self.char_cache = TTLCache(max_size, TTLS[CHAR_INFO], 'esi_char_info')
+        self.name_cache = TTLCache(max_size, TTLS[NAME_IDS], 'esi_name_id')
+        self.id_name_cache = TTLCache(max_size // 4, TTLS[ID_NAMES], 'esi_id_name')
+        self.name_misses = NegativeCache(max_size // 10, TTLS[NAME_MISSES], 'esi_name_miss', store, NAME_MISSES,
+                                         bloom_capacity=max_size)
+        self.store = store
+        self.inflight = SingleFlight('esi_inflight')
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        return {c.name: c.stats() for c in (self.name_cache, self.char_cache, self.id_name_cache,
+                                            self.name_misses, self.inflight)}
+
+    def preload(self, names: List[str], char_ids: List[int] = ()):
+        """Pull persisted results for a paste into the in-memory caches."""
+        if self.store is None:
+            return
+        self.name_cache.update(self.store.get_many(NAME_IDS, self.name_cache.missing(names)))
+        self.name_misses.preload(self.name_cache.missing(names))
+        ids = set(char_ids) | {i for n in names if (i := self.name_cache.peek(n))}
+        self.char_cache.update(self.store.get_many(CHAR_INFO, self.char_cache.missing(ids)))
+        infos = [info for i in ids if (info := self.char_cache.peek(i))]
+        entity_ids = {v for info in infos for v in (info.get('corporation_id'), info.get('alliance_id')) if v}
+        self.id_name_cache.update(self.store.get_many(ID_NAMES, self.id_name_cache.missing(entity_ids)))
+
+    async def _stored(self, ns: str, keys: List) -> Dict:
+        # SQLite reads run on a worker thread, never on the network loop.
+        return await asyncio.get_running_loop().run_in_executor(None, self.store.get_many, ns, keys)
 
     async def resolve_names_to_ids(self, session: aiohttp.ClientSession, names: List[str]) -> Dict[str, int]:
-        uncached = [n for n in names if n not in self.name_cache]
+        uncached = list(dict.fromkeys(n for n in names if n not in self.name_cache))
+        if uncached and self.store is not None:
+            self.name_cache.update(await self._stored(NAME_IDS, uncached))
+            uncached = self.name_cache.missing(uncached)
+        uncached = [n for n in uncached if n not in self.name_misses]
         if not uncached:
             return {n: self.name_cache[n] for n in names if n in self.name_cache}
 
         chunk_name_map = {n.lower(): n for n in uncached}
         res = {}
-        for i in range(0, len(uncached), 500):
-            chunk = uncached[i:i+500]
-            url = "https://esi.evetech.net/latest/universe/ids/"
+
+        async def resolve_chunk(chunk):
+            url = f"{self.base_url}/universe/ids/"
             try:
-                async with session.post(url, json=chunk, timeout=30) as response:
+                async with RATE_LIMITER.slot(url) as slot, session.post(url, json=chunk, timeout=30) as response:
+                    slot.update(response)
                     if response.status == 200:
                         data = await response.json()
+                        found = {}
                         for char in data.get('characters', []):
                             orig_name = chunk_name_map.get(char['name'].lower(), char['name'])
-                            self.name_cache[orig_name] = char['id']
-                            res[orig_name] = char['id']
+                            found[orig_name] = char['id']
+                        self.name_cache.update(found)
+                        res.update(found)
+                        self.name_misses.add_many(n for n in chunk if n not in found)
+                        if self.store is not None:
+                            self.store.put_many(NAME_IDS, found)
             except Exception as e:
                 logger.info(f"ESI name resolution error: {e}")
 
+        await asyncio.gather(*[resolve_chunk(uncached[i:i+500]) for i in range(0, len(uncached), 500)])
+
         for n in names:
             if n in self.name_cache and n not in res:
                 res[n] = self.name_cache[n]
         return res
 
     async def get_char_info(self, session: aiohttp.ClientSession, char_id: int) -> Dict:
+        # Persisted entries were pulled in by preload or get_affiliations.
         if char_id in self.char_cache:
             return self.char_cache[char_id]
 
-        url = f"https://esi.evetech.net/latest/characters/{char_id}/"
+        url = f"{self.base_url}/characters/{char_id}/"
+        return await self.inflight.do(url, lambda: self._fetch_char_info(session, char_id, url))
+
+    async def _fetch_char_info(self, session: aiohttp.ClientSession, char_id: int, url: str) -> Dict:
         try:
-            async with session.get(url, timeout=10) as response:
+            async with RATE_LIMITER.slot(url) as slot, session.get(url, timeout=10) as response:
+                slot.update(response)
                 if response.status == 200:
                     data = await response.json()
                     info = {
@@ -172,12 +225,52 @@ class ESIResolver:
                         'alliance_id': data.get('alliance_id')
                     }
                     self.char_cache[char_id] = info
+                    if self.store is not None:
+                        self.store.put(CHAR_INFO, char_id, info)
                     return info
                 logger.warning(f"ESI char info status {response.status} for {char_id}")
         except Exception as e:
             logger.warning(f"ESI char info error for {char_id}: {e}")
         return {}
 
+    async def get_affiliations(self, session: aiohttp.ClientSession, char_ids: List[int]) -> Dict[int, Dict]:
+        """Corp/alliance of many characters via POST /characters/affiliation/.
+
+        Chunks the ESI refuses (e.g. one of the ids is invalid) fall back to
+        per-character lookups."""
+        char_ids = list(dict.fromkeys(i for i in char_ids if i))
+        res = {i: info for i in char_ids if (info := self.char_cache.get(i)) is not None}
+        uncached = [i for i in char_ids if i not in res]
+        if uncached and self.store is not None:
+            stored = await self._stored(CHAR_INFO, uncached)
+            self.char_cache.update(stored)
+            res.update(stored)
+            uncached = [i for i in uncached if i not in stored]
+
+        async def resolve_chunk(chunk):
+            url = f"{self.base_url}/characters/affiliation/"
+            try:
+                async with RATE_LIMITER.slot(url) as slot, session.post(url, json=chunk, timeout=30) as response:
+                    slot.update(response)
+                    if response.status == 200:
+                        data = await response.json()
+                        found = {item['character_id']: {'corporation_id': item.get('corporation_id'),
+                                                         'alliance_id': item.get('alliance_id')}
+                                 for item in data}
+                        self.char_cache.update(found)
+                        res.update(found)
+                        if self.store is not None:
+                            self.store.put_many(CHAR_INFO, found)
+                        return
+                    logger.info(f"ESI affiliation status {response.status} for {len(chunk)} ids; falling back")
+            except Exception as e:
+                logger.info(f"ESI affiliation error: {e}; falling back")
+            infos = await asyncio.gather(*[self.get_char_info(session, i) for i in chunk])
+            res.update({i: info for i, info in zip(chunk, infos) if info})
+
+        await asyncio.gather(*[resolve_chunk(uncached[i:i+1000]) for i in range(0, len(uncached), 1000)])
+        return res
+
     async def resolve_ids_to_names(self, session: aiohttp.ClientSession, ids: List[int]) -> Dict[int, str]:
         if not ids:
             return {}
@@ -192,20 +285,29 @@ class ESIResolver:
             else:
                 uncached.append(id)
 
+        if uncached and self.store is not None:
+            stored = await self._stored(ID_NAMES, uncached)
+            self.id_name_cache.update(stored)
+            res.update(stored)
+            uncached = [i for i in uncached if i not in stored]
+
         if not uncached:
             return res
 
-        for i in range(0, len(uncached), 1000):
-            chunk = uncached[i:i+1000]
-            url = "https://esi.evetech.net/latest/universe/names/"
+        async def resolve_chunk(chunk):
+            url = f"{self.base_url}/universe/names/"
             try:
-                async with session.post(url, json=chunk, timeout=30) as response:
+                async with RATE_LIMITER.slot(url) as slot, session.post(url, json=chunk, timeout=30) as response:
+                    slot.update(response)
                     if response.status == 200:
                         data = await response.json()
-                        for item in data:
-                            self.id_name_cache[item['id']] = item['name']
-                            res[item['id']] = item['name']
+                        found = {item['id']: item['name'] for item in data}
+                        self.id_name_cache.update(found)
+                        res.update(found)
+                        if self.store is not None:
+                            self.store.put_many(ID_NAMES, found)
             except Exception as e:
                 logger.info(f"ESI id resolution error: {e}")
 
+        await asyncio.gather(*[resolve_chunk(uncached[i:i+1000]) for i in range(0, len(uncached), 1000)])
         return res
@@ -218,9 +218,9 @@ class EveKillClient(BaseAPIClient):
 
 
 class EveKillStatsProvider(StatsInterface):
-    def __init__(self, rate_limit_retry_delay=5):
+    def __init__(self, rate_limit_retry_delay=5, store=None):
         from base_api_client import APIClientFactory
-        self.client = APIClientFactory.create_client('evekill', rate_limit_retry_delay=rate_limit_retry_delay)
+        self.client = APIClientFactory.create_client('evekill', rate_limit_retry_delay=rate_limit_retry_delay, store=store)
 
     async def get_stats(self, session: aiohttp.ClientSession, char_id: int) -> Dict:
         return await self.client._get_char_short_stats_with_session(session, char_id)
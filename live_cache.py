@@ -0,0 +1,159 @@
+import json
+import time
+import atexit
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from loguru import logger
+
+# Namespaces and how long their entries stay valid. Names never change owner,
+# corp membership changes now and then, kill stats change all the time.
+# Misses expire sooner: new characters get created and start getting kills.
+NAME_IDS = 'name_id'
+ID_NAMES = 'id_name'
+CHAR_INFO = 'char_info'
+STATS = 'stats'
+NAME_MISSES = 'name_miss'
+STATS_MISSES = 'stats_miss'
+TTLS = {
+    NAME_IDS: 30 * 86400,
+    ID_NAMES: 7 * 86400,
+    CHAR_INFO: 86400,
+    STATS: 3600,
+    NAME_MISSES: 6 * 3600,
+    STATS_MISSES: 3600,
+}
+
+LIVE_CACHE_FILE = 'live.sqlite3'
+MAX_ENTRIES = 500_000
+FLUSH_INTERVAL = 0.5
+FLUSH_BATCH = 1000
+_QUERY_CHUNK = 500
+
+
+class LiveCache:
+    """Persistent write-through store for live ESI/killboard results.
+
+    Entries are JSON values keyed by (namespace, key) in a SQLite database in
+    WAL mode, each with its own expiry. Reads go straight to the database;
+    writes are queued and committed in batches by a background thread so the
+    lookup path never waits on disk. The table is trimmed to ``max_entries``
+    by dropping the entries closest to expiry.
+    """
+
+    def __init__(self, db_file, max_entries: int = MAX_ENTRIES, ttls: Dict[str, int] = None):
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttls = {**TTLS, **(ttls or {})}
+        self._read_lock = threading.Lock()
+        self._db = self._connect()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL, "
+            "PRIMARY KEY (ns, key))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)")
+        self._db.commit()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        atexit.register(self.flush, 2)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_file, timeout=10, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get(self, ns: str, key):
+        return self.get_many(ns, [key]).get(key)
+
+    def get_many(self, ns: str, keys: Iterable) -> Dict:
+        keys = {str(k): k for k in keys}
+        if not keys:
+            return {}
+        res = {}
+        now = time.time()
+        skeys = list(keys)
+        with self._read_lock:
+            for i in range(0, len(skeys), _QUERY_CHUNK):
+                chunk = skeys[i:i + _QUERY_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT key, value FROM entries WHERE ns = ? AND expires > ? "
+                    f"AND key IN ({','.join('?' * len(chunk))})", (ns, now, *chunk))
+                for key, value in rows:
+                    res[keys[key]] = json.loads(value)
+        return res
+
+    def put(self, ns: str, key, value, ttl: Optional[float] = None):
+        self.put_many(ns, {key: value}, ttl)
+
+    def put_many(self, ns: str, items: Dict, ttl: Optional[float] = None):
+        if not items:
+            return
+        # Sub-namespaces like 'stats:ZKillClient' share their parent's TTL.
+        expires = time.time() + (ttl if ttl is not None else self.ttls[ns.partition(':')[0]])
+        self._queue.put([(ns, str(k), json.dumps(v, ensure_ascii=False), expires) for k, v in items.items()])
+
+    def clear(self):
+        self.flush()
+        with self._read_lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+    def flush(self, timeout: float = 10):
+        """Block until everything queued so far is committed."""
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        atexit.unregister(self.flush)
+        self.flush()
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+        with self._read_lock:
+            self._db.close()
+
+    def _write_loop(self):
+        db = self._connect()
+        stop = False
+        while not stop:
+            rows, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.extend(item)
+                if stop or waiters or len(rows) >= FLUSH_BATCH:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if rows:
+                try:
+                    self._commit(db, rows)
+                except sqlite3.Error as e:
+                    logger.warning(f"Live cache write failed ({len(rows)} entries): {e}")
+            for w in waiters:
+                w.set()
+        db.close()
+
+    def _commit(self, db: sqlite3.Connection, rows):
+        with db:
+            db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+            db.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+            count = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                db.execute(
+                    "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY expires LIMIT ?)",
+                    (count - self.max_entries,))
@@ -0,0 +1,114 @@
+import math
+import time
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+from ttl_cache import TTLCache
+
+BLOOM_ERROR_RATE = 1e-5
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys (no false negatives)."""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from one 128-bit digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class NegativeCache:
+    """Remembers keys a lookup came back empty for, for ``ttl`` seconds.
+
+    Exact entries live in a bounded TTLCache and, with a store, are written
+    through under ``ns`` so they survive restarts. With ``bloom_capacity``
+    set, keys also go into two rotating Bloom filters, each covering half the
+    TTL, so misses the exact cache has already evicted are still recognised
+    for between ttl/2 and ttl, at a false positive rate of ``BLOOM_ERROR_RATE``.
+    """
+
+    def __init__(self, max_size: int, ttl: float, name: str = '', store=None, ns: Optional[str] = None,
+                 bloom_capacity: int = 0):
+        self.entries = TTLCache(max_size, ttl, name)
+        self.ttl = ttl
+        self.name = name
+        self.store = store
+        self.ns = ns
+        self.bloom_capacity = bloom_capacity
+        self.bloom_hits = 0
+        self._lock = threading.Lock()
+        self._blooms = []
+        self._rotated = time.monotonic()
+        if bloom_capacity:
+            self._blooms = [BloomFilter(bloom_capacity), BloomFilter(bloom_capacity)]
+
+    def _current_blooms(self):
+        # Caller holds the lock.
+        now = time.monotonic()
+        if now - self._rotated >= self.ttl / 2:
+            stale = 2 if now - self._rotated >= self.ttl else 1
+            for _ in range(stale):
+                self._blooms = [BloomFilter(self.bloom_capacity), self._blooms[0]]
+            self._rotated = now
+        return self._blooms
+
+    def add_many(self, keys: Iterable):
+        keys = list(keys)
+        if not keys:
+            return
+        self.entries.update(dict.fromkeys(keys, True))
+        if self._blooms:
+            with self._lock:
+                current = self._current_blooms()[0]
+                for key in keys:
+                    current.add(str(key))
+        if self.store is not None:
+            self.store.put_many(self.ns, dict.fromkeys(keys, True), self.ttl)
+
+    def add(self, key):
+        self.add_many([key])
+
+    def __contains__(self, key) -> bool:
+        if key in self.entries:
+            return True
+        if self._blooms:
+            with self._lock:
+                found = any(str(key) in b for b in self._current_blooms())
+            if found:
+                self.bloom_hits += 1
+                return True
+        return False
+
+    def preload(self, keys: Iterable):
+        """Pull persisted misses for ``keys`` into the exact cache."""
+        if self.store is None:
+            return
+        self.entries.update(self.store.get_many(self.ns, self.entries.missing(keys)))
+
+    def clear(self):
+        self.entries.clear()
+        with self._lock:
+            self._blooms = [BloomFilter(self.bloom_capacity) for _ in self._blooms]
+
+    def stats(self) -> Dict:
+        stats = self.entries.stats()
+        if self._blooms:
+            stats.update(bloom_hits=self.bloom_hits, bloom_keys=sum(b.count for b in self._blooms))
+        return stats
@@ -32,6 +32,13 @@ if exist "cache\names.pkl" (
     echo Copied cache\names.pkl
 )
 
+if exist "cache\CURRENT" (
+    set /p BUNDLE=<"cache\CURRENT"
+    xcopy /E /I /Q "cache\bundles\!BUNDLE!" "dist\cache\bundles\!BUNDLE!" >nul
+    copy "cache\CURRENT" "dist\cache\" >nul
+    echo Copied cache bundle !BUNDLE!
+)
+
 echo.
 echo === Copying config.yaml ===
 if exist "config.yaml" (
@@ -0,0 +1,246 @@
+import json
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from loguru import logger
+
+# Steady request rate (per second), burst size and concurrency cap per host.
+HOST_LIMITS = {
+    'esi.evetech.net': (20.0, 20, 20),
+    'zkillboard.com': (10.0, 20, 10),
+    'eve-kill.com': (10.0, 10, 10),
+}
+DEFAULT_LIMITS = (10.0, 10, 10)
+MIN_RATE = 0.2
+THROTTLE_DELAY = 5
+ESI_ERROR_LIMIT_FLOOR = 10
+# Throttle state older than this is not restored after a restart.
+PERSIST_TTL = 600
+RATE_LIMIT_STATE_FILE = 'rate_limits.json'
+
+
+class _Waiter:
+    __slots__ = ('loop', 'fut')
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.fut: Optional[asyncio.Future] = None
+
+
+def _wake(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(None)
+
+
+class HostLimiter:
+    """Token bucket plus concurrency cap for one host.
+
+    Callers queue in FIFO order. Only the head of the queue waits on the
+    bucket: it sleeps for the refill or block time, or until ``release``
+    wakes it when the host is at its concurrency cap. Waiters may sit on
+    different event loops, so wake-ups go through call_soon_threadsafe.
+
+    Throttle signals (429/420, Retry-After, a low ESI error budget) block the
+    host for every caller and halve its send rate; successful responses
+    raise the rate back towards the configured one.
+    """
+
+    def __init__(self, host: str, rate: float, burst: int, max_concurrent: int):
+        self.host = host
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.tokens = float(burst)
+        self.blocked_until = 0.0
+        self.active = 0
+        self.throttled = 0
+        self._last = time.monotonic()
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a slot, or return how long to wait before trying again
+        (inf: until a slot is released). Caller holds the lock."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        blocked = self.blocked_until - time.time()
+        if blocked > 0:
+            return blocked
+        if self.active >= self.max_concurrent:
+            return math.inf
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        self.active += 1
+        return 0
+
+    def _wake_head(self):
+        # Caller holds the lock.
+        if self._queue and (head := self._queue[0]).fut is not None:
+            head.loop.call_soon_threadsafe(_wake, head.fut)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._queue and self._take() == 0:
+                return
+            waiter = _Waiter(loop)
+            self._queue.append(waiter)
+        try:
+            while True:
+                with self._lock:
+                    wait = None
+                    if self._queue[0] is waiter:
+                        wait = self._take()
+                        if wait == 0:
+                            self._queue.popleft()
+                            self._wake_head()
+                            return
+                    waiter.fut = loop.create_future()
+                timeout = None if wait is None or wait == math.inf else wait
+                try:
+                    await asyncio.wait_for(waiter.fut, timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                was_head = self._queue[0] is waiter
+                self._queue.remove(waiter)
+                if was_head:
+                    self._wake_head()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            self._wake_head()
+
+    def block(self, seconds: float, reason: str):
+        with self._lock:
+            now = time.time()
+            if now + seconds <= self.blocked_until:
+                return
+            # Responses already in flight when the host pushed back only
+            # extend the pause; the rate is cut once per throttle episode.
+            new_episode = self.blocked_until <= now
+            self.blocked_until = now + seconds
+            self.tokens = 0
+            if new_episode:
+                self.rate = max(MIN_RATE, self.rate / 2)
+                self.throttled += 1
+        if new_episode:
+            logger.warning(f"{self.host} throttled ({reason}); pausing {seconds:.0f}s, rate now {self.rate:.1f}/s")
+
+    def on_response(self, status: int, headers, default_delay: float = THROTTLE_DELAY) -> bool:
+        """Adjust to a response; returns True if the host asked us to back off."""
+        retry_after = _parse_float(headers.get('Retry-After'))
+        if status in (420, 429, 1015) or retry_after:
+            self.block(retry_after or default_delay, f"status {status}")
+            return True
+        remain = _parse_float(headers.get('X-ESI-Error-Limit-Remain'))
+        if remain is not None and remain < ESI_ERROR_LIMIT_FLOOR:
+            reset = _parse_float(headers.get('X-ESI-Error-Limit-Reset')) or THROTTLE_DELAY
+            self.block(reset, f"ESI error budget {remain:.0f}")
+            return True
+        if status < 400 and self.rate < self.base_rate:
+            with self._lock:
+                self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+        return False
+
+    def stats(self) -> Dict:
+        return {'rate': round(self.rate, 2), 'active': self.active, 'queued': len(self._queue),
+                'throttled': self.throttled,
+                'blocked_for': max(0.0, round(self.blocked_until - time.time(), 1))}
+
+
+class _Slot:
+    def __init__(self, owner: 'RateLimiter', limiter: HostLimiter):
+        self.owner = owner
+        self.limiter = limiter
+        self.throttled = False
+
+    async def __aenter__(self):
+        await self.limiter.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.limiter.release()
+
+    def update(self, response, default_delay: float = THROTTLE_DELAY):
+        self.throttled = self.limiter.on_response(response.status, response.headers, default_delay)
+        if self.throttled:
+            self.owner.save()
+
+
+class RateLimiter:
+    """Per-host limiters shared by every outbound HTTP client::
+
+        async with RATE_LIMITER.slot(url) as slot:
+            async with session.get(url) as response:
+                slot.update(response)
+    """
+
+    def __init__(self):
+        self.hosts: Dict[str, HostLimiter] = {}
+        self.state_file: Optional[Path] = None
+        self._lock = threading.Lock()
+
+    def host(self, host: str) -> HostLimiter:
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimiter(host, *HOST_LIMITS.get(host, DEFAULT_LIMITS))
+            return self.hosts[host]
+
+    def slot(self, url: str) -> _Slot:
+        return _Slot(self, self.host(urlsplit(url).hostname or ''))
+
+    def load(self, state_file):
+        """Restore recent throttle state so a restart doesn't immediately
+        hammer a host that just told us to slow down."""
+        self.state_file = Path(state_file)
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for host, rec in state.items():
+            if now - rec.get('saved_at', 0) > PERSIST_TTL:
+                continue
+            limiter = self.host(host)
+            limiter.blocked_until = rec.get('blocked_until', 0)
+            limiter.rate = min(limiter.base_rate, max(MIN_RATE, rec.get('rate', limiter.base_rate)))
+            logger.info(f"Restored rate limit state for {host}: {limiter.stats()}")
+
+    def save(self):
+        if self.state_file is None:
+            return
+        now = time.time()
+        state = {h: {'blocked_until': l.blocked_until, 'rate': l.rate, 'saved_at': now}
+                 for h, l in self.hosts.items() if l.rate < l.base_rate or l.blocked_until > now}
+        try:
+            tmp = self.state_file.with_suffix('.tmp')
+            tmp.write_text(json.dumps(state))
+            tmp.replace(self.state_file)
+        except OSError as e:
+            logger.info(f"Could not save rate limit state: {e}")
+
+    def stats(self) -> Dict[str, Dict]:
+        return {h: l.stats() for h, l in self.hosts.items()}
+
+
+def _parse_float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+RATE_LIMITER = RateLimiter()
@@ -1,10 +1,11 @@
-from .models import PilotData, PilotState, DScanResult
+from .models import PilotData, PilotRecord, PilotState, DScanResult
+from .pilot_store import PilotStore
 from .pilot_service import PilotService
 from .dscan_service import DScanService
 from .api import APIClient, PilotAPIClient
 
 __all__ = [
-    'PilotData', 'PilotState', 'DScanResult', 
+    'PilotData', 'PilotRecord', 'PilotState', 'DScanResult', 'PilotStore',
     'PilotService', 'DScanService',
     'APIClient', 'PilotAPIClient'
 ]
@@ -1,16 +1,17 @@
-import json
 import time
+import uuid
 import socket
 import threading
 import atexit
 from multiprocessing import Process
-from typing import Optional, Dict, Callable
-from dataclasses import dataclass
+from typing import Optional, Dict, Callable, Set
+from dataclasses import dataclass, field
 
 import requests
 from loguru import logger
 
-from .schemas import EventType
+from .schemas import EventType, SESSION_HEADER
+from .codec import loads, msgpack, FrameDecoder, MSGPACK_MEDIA, NDJSON_MEDIA
 from .server import run_server
 from services.models import PilotState, PilotData
 
@@ -29,6 +30,10 @@ class ServerConfig:
     ships_file: str = "ships.json"
     rate_limit_delay: int = 5
     stats_limit: int = 50
+    stats_budget: int = 200
+    stats_deadline: float = 30
+    priority_entities: list = field(default_factory=list)
+    session_ttl: float = 1800
     
     @classmethod
     def from_config(cls, cfg) -> "ServerConfig":
@@ -42,13 +47,20 @@ class ServerConfig:
             ships_file=cfg.get("ships_file", "ships.json"),
             rate_limit_delay=dscan_cfg.get("rate_limit_retry_delay", 5),
             stats_limit=dscan_cfg.get("aggregated_mode_threshold", 50),
+            stats_budget=dscan_cfg.get("stats_budget", 200),
+            stats_deadline=dscan_cfg.get("stats_deadline", 30),
+            priority_entities=[e for grp in dscan_cfg.get("groups", {}).values()
+                               for e in grp.get("entities", [])],
+            session_ttl=api_cfg.get("session_ttl", 1800),
         )
 
 
 class APIClient:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, session_id: Optional[str] = None):
         self.base_url = base_url.rstrip("/")
         self._session = requests.Session()
+        if session_id:
+            self._session.headers[SESSION_HEADER] = session_id
     
     def health(self) -> bool:
         try:
@@ -61,25 +73,36 @@ class APIClient:
         resp = self._session.post(
             f"{self.base_url}/pilots/lookup",
             json={"names": names},
+            headers={"Accept": MSGPACK_MEDIA} if msgpack is not None else None,
             stream=True,
             timeout=(10, None)
         )
         resp.raise_for_status()
         
+        for data in self._iter_events(resp):
+            on_event(data)
+            if data.get("type") == EventType.COMPLETE.value:
+                break
+    
+    def _iter_events(self, resp):
+        if resp.headers.get("content-type", "").startswith(MSGPACK_MEDIA):
+            decoder = FrameDecoder()
+            unpacker = msgpack.Unpacker()
+            for chunk in resp.iter_content(chunk_size=None):
+                unpacker.feed(chunk)
+                for frame in unpacker:
+                    yield decoder.decode(frame)
+            return
         for line in resp.iter_lines():
-            if not line:
-                continue
-            line = line.decode("utf-8")
-            if line.startswith("data: "):
-                data = json.loads(line[6:])
-                on_event(data)
-                if data.get("type") == EventType.COMPLETE.value:
-                    break
+            if line.startswith(b"data: "):
+                yield loads(line[6:])
     
     def get_pilots(self) -> Dict[str, dict]:
-        resp = self._session.get(f"{self.base_url}/pilots", timeout=10)
+        resp = self._session.get(f"{self.base_url}/pilots", headers={"Accept": NDJSON_MEDIA},
+                                 stream=True, timeout=10)
         resp.raise_for_status()
-        return resp.json()
+        pilots = (loads(line) for line in resp.iter_lines() if line)
+        return {p["name"]: p for p in pilots}
     
     def reset_pilots(self):
         resp = self._session.post(f"{self.base_url}/pilots/reset", timeout=5)
@@ -89,6 +112,11 @@ class APIClient:
         resp = self._session.post(f"{self.base_url}/pilots/clear-cache", timeout=5)
         resp.raise_for_status()
     
+    def get_cache_stats(self) -> Dict[str, dict]:
+        resp = self._session.get(f"{self.base_url}/pilots/cache-stats", timeout=5)
+        resp.raise_for_status()
+        return resp.json()
+    
     def parse_dscan(self, data: str, diff_timeout: float = 60.0) -> Optional[dict]:
         resp = self._session.post(
             f"{self.base_url}/dscan/parse",
@@ -100,6 +128,14 @@ class APIClient:
         resp.raise_for_status()
         return resp.json()
     
+    def get_dscan_url(self, key: Optional[str] = None, wait: float = 0) -> Optional[str]:
+        params = {"wait": wait, **({"key": key} if key else {})}
+        resp = self._session.get(f"{self.base_url}/dscan/url", params=params, timeout=wait + 5)
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return resp.json().get("url")
+    
     def get_dscan(self) -> Optional[dict]:
         resp = self._session.get(f"{self.base_url}/dscan", timeout=5)
         if resp.status_code == 404:
@@ -149,6 +185,12 @@ class ServerManager:
                 "cache_dir": self.cfg.cache_dir,
                 "stats_provider": self.cfg.stats_provider,
                 "ships_file": self.cfg.ships_file,
+                "rate_limit_delay": self.cfg.rate_limit_delay,
+                "stats_limit": self.cfg.stats_limit,
+                "stats_budget": self.cfg.stats_budget,
+                "stats_deadline": self.cfg.stats_deadline,
+                "priority_entities": self.cfg.priority_entities,
+                "session_ttl": self.cfg.session_ttl,
             }
             
             logger.info(f"Starting API server on {self.base_url}")
@@ -201,8 +243,16 @@ class PilotAPIClient:
         self._client: Optional[APIClient] = None
         self._pilots: Dict[str, PilotData] = {}
         self._stream_thread: Optional[threading.Thread] = None
+        self._generation = 0
+        # Bumped whenever the stream changes ``_pilots``, which is replaced
+        # rather than mutated so readers never see it mid-update.
+        self.version = 0
+        self.joined: Set[str] = set()
+        self.left: Set[str] = set()
         self._auto_start = auto_start
         self.stats_limit = self.cfg.stats_limit
+        # Keeps this client's pilots apart from other clients of a shared server.
+        self.session_id = uuid.uuid4().hex
     
     def _ensure_server(self) -> bool:
         if self._client and self._client.health():
@@ -217,7 +267,7 @@ class PilotAPIClient:
         if not self._mgr.start(auto_port=True):
             return False
         
-        self._client = APIClient(self._mgr.base_url)
+        self._client = APIClient(self._mgr.base_url, self.session_id)
         return True
     
     def set_pilots(self, clipboard_data: str) -> bool:
@@ -225,13 +275,31 @@ class PilotAPIClient:
             return False
         
         self._pilots = {}
+        self._generation += 1
+        self.version += 1
+        generation = self._generation
+        # Updates carry only changed fields (None for cleared ones), so keep
+        # the last full dict per pilot to apply them to.
+        raw: Dict[str, dict] = {}
         
         def on_event(evt: dict):
+            if generation != self._generation:
+                return
             evt_type = evt.get("type")
             pilots_data = evt.get("pilots", {})
+            if evt_type == EventType.INITIAL.value:
+                self.joined = set(evt.get("joined", ()))
+                self.left = set(evt.get("left", ()))
             
+            if not pilots_data:
+                return
+            updates = {}
             for name, pdata in pilots_data.items():
-                self._pilots[name] = _dict_to_pilot(pdata)
+                fields = raw.setdefault(name, {})
+                fields.update(pdata)
+                updates[name] = _dict_to_pilot(fields)
+            self._pilots = {**self._pilots, **updates}
+            self.version += 1
         
         try:
             self._stream_thread = threading.Thread(
@@ -255,6 +323,9 @@ class PilotAPIClient:
     
     def reset(self):
         self._pilots = {}
+        self._generation += 1
+        self.version += 1
+        self.joined, self.left = set(), set()
         if self._client:
             try:
                 self._client.reset_pilots()
@@ -268,6 +339,14 @@ class PilotAPIClient:
             except:
                 pass
     
+    def get_cache_stats(self) -> Dict[str, dict]:
+        if self._client:
+            try:
+                return self._client.get_cache_stats()
+            except:
+                pass
+        return {}
+    
     def shutdown(self):
         if self._mgr:
             self._mgr.stop()
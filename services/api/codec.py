@@ -0,0 +1,92 @@
+import json
+from typing import Dict, Optional, Sequence
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SSE_MEDIA = "text/event-stream"
+JSON_MEDIA = "application/json"
+NDJSON_MEDIA = "application/x-ndjson"
+MSGPACK_MEDIA = "application/x-msgpack"
+# (id field, name field, table) for the names msgpack frames send once per
+# stream in id tables instead of on every pilot.
+INTERNED = (("corp_id", "corp_name", "corps"), ("alliance_id", "alliance_name", "alliances"))
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def negotiate(accept: Optional[str], offered: Sequence[str]) -> str:
+    """The first of ``offered[1:]`` the Accept header names and we can
+    encode, else ``offered[0]``."""
+    accept = accept or ""
+    for media in offered[1:]:
+        if media in accept and (media != MSGPACK_MEDIA or msgpack is not None):
+            return media
+    return offered[0]
+
+
+class StreamEncoder:
+    """Encodes one lookup stream's events as SSE JSON, or as msgpack frames
+    with corp and alliance names interned."""
+
+    def __init__(self, media: str = SSE_MEDIA):
+        self.media = media
+        self._names: Dict[str, Dict[int, str]] = {table: {} for _, _, table in INTERNED}
+        # Last id sent per pilot and id field, for patches that change only a name.
+        self._ids: Dict[str, Dict[str, int]] = {}
+
+    def encode(self, event: dict) -> bytes:
+        if self.media != MSGPACK_MEDIA:
+            return b"data: " + dumps(event) + b"\n\n"
+        pilots = event.get("pilots")
+        if pilots:
+            event = dict(event)
+            event["pilots"] = {name: self._intern(event, name, p) for name, p in pilots.items()}
+        return msgpack.packb(event)
+
+    def _intern(self, event: dict, pilot_name: str, pilot: dict) -> dict:
+        pilot = dict(pilot)
+        ids = self._ids.setdefault(pilot_name, {})
+        for id_key, name_key, table in INTERNED:
+            if id_key in pilot:
+                ids[id_key] = pilot[id_key]
+            name = pilot.pop(name_key, None)
+            entity_id = ids.get(id_key)
+            if not (name and entity_id):
+                continue
+            if self._names[table].get(entity_id) != name:
+                self._names[table][entity_id] = name
+                event.setdefault(table, []).append([entity_id, name])
+            # The client fills names in from ids, so a renamed pilot needs one.
+            pilot[id_key] = entity_id
+        return pilot
+
+
+class FrameDecoder:
+    """Turns StreamEncoder msgpack frames back into the JSON event dicts."""
+
+    def __init__(self):
+        self._names: Dict[str, Dict[int, str]] = {table: {} for _, _, table in INTERNED}
+
+    def decode(self, frame: dict) -> dict:
+        for _, _, table in INTERNED:
+            self._names[table].update(frame.pop(table, ()))
+        for pilot in (frame.get("pilots") or {}).values():
+            for id_key, name_key, table in INTERNED:
+                if id_key in pilot:
+                    pilot[name_key] = self._names[table].get(pilot[id_key])
+        return frame
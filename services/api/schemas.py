@@ -3,6 +3,11 @@ from dataclasses import dataclass, field, asdict
 from typing import Optional, Dict, List
 
 
+# Header a client names its session with; without it requests share the
+# default session.
+SESSION_HEADER = "X-Session-ID"
+
+
 class EventType(str, Enum):
     INITIAL = "initial"
     UPDATE = "update"
@@ -32,6 +37,8 @@ class StreamEvent:
     type: EventType
     pilots: Optional[Dict[str, dict]] = None
     updated: Optional[List[str]] = None
+    joined: Optional[List[str]] = None
+    left: Optional[List[str]] = None
     error: Optional[str] = None
 
     def to_dict(self):
@@ -40,6 +47,10 @@ class StreamEvent:
             d["pilots"] = self.pilots
         if self.updated is not None:
             d["updated"] = self.updated
+        if self.joined is not None:
+            d["joined"] = self.joined
+        if self.left is not None:
+            d["left"] = self.left
         if self.error is not None:
             d["error"] = self.error
         return d
@@ -59,3 +70,6 @@ class DScanResponse:
     ship_diffs: Dict[str, int] = field(default_factory=dict)
     group_diffs: Dict[str, int] = field(default_factory=dict)
     dscan_url: Optional[str] = None
+    # Set while the dscan.info link is still uploading; fetch it from
+    # /dscan/url.
+    dscan_key: Optional[str] = None
@@ -1,5 +1,4 @@
 import asyncio
-import json
 import sys
 from pathlib import Path
 from contextlib import asynccontextmanager
@@ -10,15 +9,29 @@ if str(_root) not in sys.path:
     sys.path.insert(0, str(_root))
 
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from loguru import logger
 
-from services.api.schemas import EventType, PilotUpdate, StreamEvent, DScanResponse
-from services.models import PilotState
-from services.pilot_service import PilotService
-from services.dscan_service import DScanService, get_dscan_info_url
+from services.api.schemas import EventType, PilotUpdate, StreamEvent, DScanResponse, SESSION_HEADER
+from services.api.codec import (dumps, msgpack, negotiate, StreamEncoder,
+                                JSON_MEDIA, MSGPACK_MEDIA, NDJSON_MEDIA, SSE_MEDIA)
+from services.api.sessions import Session, SessionManager
+from services.pilot_service import PilotBackend
+from services.dscan_service import DScanService, DScanInfoLinks
+
+
+# An idle lookup stream is closed after this long.
+STREAM_TIMEOUT = 300
+# Changes landing this close together go out as one update.
+COALESCE_WINDOW = 0.025
+# How often idle sessions are looked for.
+SESSION_SWEEP_INTERVAL = 60
+# Longest a /dscan/url request may wait for an upload to finish.
+DSCAN_URL_MAX_WAIT = 15
+# Pilots per chunk of an NDJSON snapshot.
+NDJSON_CHUNK = 256
 
 
 class LookupRequest(BaseModel):
@@ -31,34 +44,49 @@ class DScanParseRequest(BaseModel):
     diff_timeout: float = 60.0
 
 
-_pilot_svc: Optional[PilotService] = None
-_dscan_svc: Optional[DScanService] = None
+_sessions: Optional[SessionManager] = None
+_links: Optional[DScanInfoLinks] = None
 
 
-def get_pilot_svc() -> PilotService:
-    global _pilot_svc
-    return _pilot_svc
+def get_session(request: Request) -> Session:
+    return _sessions.get(request.headers.get(SESSION_HEADER))
 
 
-def get_dscan_svc() -> DScanService:
-    global _dscan_svc
-    return _dscan_svc
+async def _expire_sessions():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        _sessions.expire_idle()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global _pilot_svc, _dscan_svc
+    global _sessions, _links
     cfg = app.state.cfg
-    _pilot_svc = PilotService(
+    backend = PilotBackend(
         cfg.get("cache_dir", "cache"),
         cfg.get("stats_provider", "zkill"),
-        cfg.get("rate_limit_delay", 5),
-        cfg.get("stats_limit", 50)
+        cfg.get("rate_limit_delay", 5)
+    )
+    _sessions = SessionManager(
+        backend,
+        DScanService(cfg.get("ships_file", "ships.json")).ships,
+        cfg.get("session_ttl", 1800),
+        {
+            "stats_limit": cfg.get("stats_limit", 50),
+            "priority_entities": cfg.get("priority_entities", ()),
+            "stats_budget": cfg.get("stats_budget", 200),
+            "stats_deadline": cfg.get("stats_deadline", 30),
+        }
     )
-    _dscan_svc = DScanService(cfg.get("ships_file", "ships.json"))
+    # Uploads run as tasks on the server's own loop.
+    _links = DScanInfoLinks(asyncio.get_running_loop())
+    sweeper = asyncio.create_task(_expire_sessions())
     logger.info("Services initialized")
     yield
     logger.info("Shutting down services")
+    sweeper.cancel()
+    await _links.aclose()
+    _sessions.close()
 
 
 def create_app(cfg: dict = None) -> FastAPI:
@@ -77,78 +105,106 @@ def create_app(cfg: dict = None) -> FastAPI:
         return {"status": "ok"}
     
     @app.post("/pilots/lookup")
-    async def lookup_pilots(req: LookupRequest):
-        svc = get_pilot_svc()
-        dscan_svc = get_dscan_svc()
+    async def lookup_pilots(req: LookupRequest, request: Request):
+        session = get_session(request)
+        svc = session.pilots
         
-        if dscan_svc.is_dscan_format(req.names):
+        if session.dscan.is_dscan_format(req.names):
             return JSONResponse({"error": "dscan_format_detected", "message": "Use /dscan/parse for dscan data"}, status_code=400)
         
         if not svc.set_pilots(req.names):
             return JSONResponse({"error": "invalid_input"}, status_code=400)
+        generation = svc.generation
+        media = negotiate(request.headers.get("accept"), (SSE_MEDIA, MSGPACK_MEDIA))
+        encoder = StreamEncoder(media)
         
         async def stream():
-            pilots = svc.get_pilots()
-            initial = {n: _pilot_to_dict(p) for n, p in pilots.items()}
-            evt = StreamEvent(type=EventType.INITIAL, pilots=initial)
-            yield f"data: {json.dumps(evt.to_dict())}\n\n"
-            
-            prev_states = {n: (p.state, p.stats) for n, p in pilots.items()}
-            max_iters = 6000
-            
-            for _ in range(max_iters):
-                await asyncio.sleep(0.05)
-                pilots = svc.get_pilots()
-                updated = []
-                
-                for name, pilot in pilots.items():
-                    prev_state, prev_stats = prev_states.get(name, (None, None))
-                    if pilot.state != prev_state or pilot.stats != prev_stats:
-                        updated.append(name)
-                        prev_states[name] = (pilot.state, pilot.stats)
-                
-                if updated:
-                    upd_pilots = {n: _pilot_to_dict(pilots[n]) for n in updated}
-                    evt = StreamEvent(type=EventType.UPDATE, pilots=upd_pilots, updated=updated)
-                    yield f"data: {json.dumps(evt.to_dict())}\n\n"
-                
-                terminal = (PilotState.FOUND, PilotState.NOT_FOUND, 
-                           PilotState.ERROR, PilotState.CACHE_HIT, PilotState.RATE_LIMITED)
-                all_done = all(p.state in terminal for p in pilots.values())
-                
-                if all_done:
-                    final = {n: _pilot_to_dict(p) for n, p in pilots.items()}
-                    evt = StreamEvent(type=EventType.COMPLETE, pilots=final)
-                    yield f"data: {json.dumps(evt.to_dict())}\n\n"
-                    return
-            
-            final = {n: _pilot_to_dict(p) for n, p in pilots.items()}
-            evt = StreamEvent(type=EventType.COMPLETE, pilots=final)
-            yield f"data: {json.dumps(evt.to_dict())}\n\n"
+            # Subscribe before the snapshot so no change can fall in between.
+            sub = svc.subscribe()
+            session.streams += 1
+            try:
+                version = svc.version
+                sent = {n: _pilot_to_dict(p) for n, p in svc.get_pilots().items()}
+                evt = StreamEvent(type=EventType.INITIAL, pilots=sent,
+                                  joined=sorted(svc.joined), left=sorted(svc.left))
+                yield encoder.encode(evt.to_dict())
+
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + STREAM_TIMEOUT
+                while True:
+                    if svc.generation != generation:
+                        return
+                    # Check before collecting, so the changes that finished
+                    # the lookup still go out.
+                    done = svc.is_done()
+                    changes = svc.changes_since(version)
+                    version = changes.version
+                    patches = {}
+                    for name, pilot in changes.records.items():
+                        cur = _pilot_to_dict(pilot)
+                        patch = _pilot_patch(sent.get(name, {}), cur)
+                        if patch:
+                            patches[name] = patch
+                            sent[name] = cur
+                    if patches:
+                        evt = StreamEvent(type=EventType.UPDATE, pilots=patches, updated=list(patches))
+                        yield encoder.encode(evt.to_dict())
+                    if done or not await sub.wait(deadline - loop.time(), COALESCE_WINDOW):
+                        break
+
+                # Everything has already gone out as patches.
+                evt = StreamEvent(type=EventType.COMPLETE)
+                yield encoder.encode(evt.to_dict())
+            finally:
+                svc.unsubscribe(sub)
+                session.streams -= 1
+                session.touch()
         
-        return StreamingResponse(stream(), media_type="text/event-stream")
+        return StreamingResponse(stream(), media_type=media)
     
     @app.get("/pilots")
-    async def get_pilots():
-        svc = get_pilot_svc()
+    async def get_pilots(request: Request):
+        svc = get_session(request).pilots
         pilots = svc.get_pilots()
-        return {n: _pilot_to_dict(p) for n, p in pilots.items()}
+        media = negotiate(request.headers.get("accept"), (JSON_MEDIA, NDJSON_MEDIA, MSGPACK_MEDIA))
+        if media == NDJSON_MEDIA:
+            # One pilot per line, so clients can start on a big local early.
+            def lines():
+                rows = [_pilot_to_dict(p) for p in pilots.values()]
+                for i in range(0, len(rows), NDJSON_CHUNK):
+                    yield b"".join(dumps(row) + b"\n" for row in rows[i:i + NDJSON_CHUNK])
+            return StreamingResponse(lines(), media_type=NDJSON_MEDIA)
+        body = {n: _pilot_to_dict(p) for n, p in pilots.items()}
+        if media == MSGPACK_MEDIA:
+            return Response(msgpack.packb(body), media_type=MSGPACK_MEDIA)
+        return Response(dumps(body), media_type=JSON_MEDIA)
+    
+    @app.get("/pilots/diff")
+    async def get_pilots_diff(request: Request):
+        svc = get_session(request).pilots
+        return {"generation": svc.generation, "joined": sorted(svc.joined), "left": sorted(svc.left)}
     
     @app.post("/pilots/reset")
-    async def reset_pilots():
-        svc = get_pilot_svc()
+    async def reset_pilots(request: Request):
+        svc = get_session(request).pilots
         svc.reset()
         return {"status": "ok"}
     
     @app.post("/pilots/clear-cache")
-    async def clear_cache():
-        svc = get_pilot_svc()
+    async def clear_cache(request: Request):
+        svc = get_session(request).pilots
         svc.clear_caches()
         return {"status": "ok"}
     
+    @app.get("/pilots/cache-stats")
+    async def cache_stats(request: Request):
+        svc = get_session(request).pilots
+        return {**svc.get_cache_stats(), "sessions": _sessions.stats()}
+    
     @app.post("/dscan/parse")
-    async def parse_dscan(req: DScanParseRequest):
-        svc = get_dscan_svc()
+    async def parse_dscan(req: DScanParseRequest, request: Request):
+        session = get_session(request)
+        svc = session.dscan
         
         if not svc.is_dscan_format(req.data):
             return JSONResponse({"error": "not_dscan_format"}, status_code=400)
@@ -160,18 +216,38 @@ def create_app(cfg: dict = None) -> FastAPI:
         if not res:
             return JSONResponse({"error": "parse_failed"}, status_code=400)
         
+        key = session.dscan_link = _links.submit(req.data)
+        url = _links.get(key)
         return DScanResponse(
             ship_counts=res.ship_counts,
             total_ships=res.total_ships,
             group_totals=svc.get_group_totals(),
             ship_diffs=svc.get_ship_diffs(),
             group_diffs=svc.get_group_diffs(),
-            dscan_url=get_dscan_info_url(req.data)
+            dscan_url=url,
+            dscan_key=None if url else key
         )
     
+    @app.get("/dscan/url")
+    async def get_dscan_url(request: Request, key: Optional[str] = None, wait: float = 0):
+        """dscan.info link for ``key``, or for the session's last dscan.
+        With ``wait``, holds the request until a running upload finishes."""
+        key = key or get_session(request).dscan_link
+        if not key:
+            return JSONResponse({"error": "no_data"}, status_code=404)
+        url = _links.get(key)
+        future = _links.future(key)
+        if url is None and future is not None and wait > 0:
+            try:
+                url = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                             min(wait, DSCAN_URL_MAX_WAIT))
+            except asyncio.TimeoutError:
+                pass
+        return {"key": key, "url": url, "pending": url is None and _links.future(key) is not None}
+    
     @app.get("/dscan")
-    async def get_dscan():
-        svc = get_dscan_svc()
+    async def get_dscan(request: Request):
+        svc = get_session(request).dscan
         res = svc.last_result
         if not res:
             return JSONResponse({"error": "no_data"}, status_code=404)
@@ -185,8 +261,8 @@ def create_app(cfg: dict = None) -> FastAPI:
         )
     
     @app.post("/dscan/reset")
-    async def reset_dscan():
-        svc = get_dscan_svc()
+    async def reset_dscan(request: Request):
+        svc = get_session(request).dscan
         svc.reset()
         return {"status": "ok"}
     
@@ -217,6 +293,13 @@ def _pilot_to_dict(pilot) -> dict:
     return d
 
 
+def _pilot_patch(prev: dict, cur: dict) -> dict:
+    """Fields of ``cur`` that differ from ``prev``; cleared fields map to None."""
+    patch = {k: v for k, v in cur.items() if prev.get(k) != v}
+    patch.update((k, None) for k in prev.keys() - cur.keys() if prev[k] is not None)
+    return patch
+
+
 def run_server(host: str = "127.0.0.1", port: int = 8721, cfg: dict = None):
     import uvicorn
     import signal
@@ -0,0 +1,77 @@
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from loguru import logger
+
+from services.pilot_service import PilotBackend, PilotService
+from services.dscan_service import DScanService
+
+DEFAULT_SESSION = "default"
+MAX_SESSION_ID = 64
+
+
+@dataclass
+class Session:
+    id: str
+    pilots: PilotService
+    dscan: DScanService
+    last_seen: float = field(default_factory=time.monotonic)
+    # Open lookup streams keep a session alive however long they run.
+    streams: int = 0
+    # Key of the dscan.info link for the last parsed dscan.
+    dscan_link: Optional[str] = None
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
+class SessionManager:
+    """Pilot and dscan state per client session, all on one PilotBackend so
+    the built-in cache, live cache, stats cache and connection pool are
+    shared. Sessions start on first use and are dropped after ``idle_ttl``
+    seconds without a request."""
+
+    def __init__(self, backend: PilotBackend, ships: Dict, idle_ttl: float = 1800,
+                 pilot_opts: Optional[Dict] = None):
+        self.backend = backend
+        self.ships = ships
+        self.idle_ttl = idle_ttl
+        self.pilot_opts = pilot_opts or {}
+        self.sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: Optional[str]) -> Session:
+        session_id = (session_id or DEFAULT_SESSION)[:MAX_SESSION_ID]
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = Session(
+                    session_id, PilotService(backend=self.backend, **self.pilot_opts),
+                    DScanService(ships=self.ships))
+                logger.info(f"Session {session_id} started ({len(self.sessions)} active)")
+            session.touch()
+            return session
+
+    def expire_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            expired = [s for s in self.sessions.values() if not s.streams and s.last_seen < cutoff]
+            for session in expired:
+                del self.sessions[session.id]
+        for session in expired:
+            session.pilots.shutdown()
+        if expired:
+            logger.info(f"Expired {len(expired)} idle sessions ({len(self.sessions)} active)")
+        return len(expired)
+
+    def close(self):
+        with self._lock:
+            sessions, self.sessions = list(self.sessions.values()), {}
+        for session in sessions:
+            session.pilots.shutdown()
+        self.backend.shutdown()
+
+    def stats(self) -> Dict:
+        sessions = list(self.sessions.values())
+        return {"active": len(sessions), "streaming": sum(1 for s in sessions if s.streams)}
@@ -1,31 +1,97 @@
 import json
 import copy
 import time
-import requests
+import asyncio
+import hashlib
+import threading
+import concurrent.futures
+import aiohttp
 from pathlib import Path
 from typing import Optional, Dict
 from loguru import logger
 
 from .models import DScanResult
+from rate_limiter import RATE_LIMITER
+from ttl_cache import TTLCache
 
+DSCAN_INFO_URL = "https://dscan.info/"
+DSCAN_INFO_TIMEOUT = 10
+# Share links don't expire on dscan.info; this only bounds memory.
+DSCAN_LINK_CACHE_SIZE = 256
+DSCAN_LINK_TTL = 24 * 3600
 
-def get_dscan_info_url(paste_data: str) -> Optional[str]:
+
+def paste_key(paste_data: str) -> str:
+    return hashlib.blake2b(paste_data.strip().encode(), digest_size=16).hexdigest()
+
+
+async def upload_to_dscan_info(session: aiohttp.ClientSession, paste_data: str) -> Optional[str]:
     try:
-        ts = int(time.time() * 1000)
-        resp = requests.post(
-            f"https://dscan.info/?_={ts}", data={"paste": paste_data}, timeout=10)
-        if resp.status_code != 200:
-            return None
-        txt = resp.text.strip()
+        url = f"{DSCAN_INFO_URL}?_={int(time.time() * 1000)}"
+        async with RATE_LIMITER.slot(url) as slot:
+            async with session.post(url, data={"paste": paste_data},
+                                    timeout=aiohttp.ClientTimeout(total=DSCAN_INFO_TIMEOUT)) as resp:
+                slot.update(resp)
+                if resp.status != 200:
+                    return None
+                txt = (await resp.text()).strip()
         return f"https://dscan.info/v/{txt.split(';')[1]}" if txt.startswith("OK;") else None
     except Exception as e:
         logger.info(f"dscan.info request failed: {e}")
         return None
 
 
+class DScanInfoLinks:
+    """dscan.info share links, uploaded in the background and memoized by
+    paste content hash. Uploads run on ``loop``, or on a thread of their
+    own without one; callers never wait on dscan.info."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.links = TTLCache(DSCAN_LINK_CACHE_SIZE, DSCAN_LINK_TTL, 'dscan_links')
+        self._pending: Dict[str, concurrent.futures.Future] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = threading.Lock()
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True, name='dscan-info').start()
+        self.loop = loop
+
+    def submit(self, paste_data: str) -> str:
+        """Start uploading ``paste_data`` unless its link is known or already
+        on the way; returns the key to look the link up by."""
+        key = paste_key(paste_data)
+        with self._lock:
+            if key not in self.links and key not in self._pending:
+                self._pending[key] = asyncio.run_coroutine_threadsafe(self._upload(key, paste_data), self.loop)
+        return key
+
+    def get(self, key: str) -> Optional[str]:
+        return self.links.get(key)
+
+    def future(self, key: str) -> Optional[concurrent.futures.Future]:
+        """The upload still running for ``key``, if any."""
+        return self._pending.get(key)
+
+    async def _upload(self, key: str, paste_data: str) -> Optional[str]:
+        try:
+            if self._session is None or self._session.closed:
+                self._session = aiohttp.ClientSession()
+            url = await upload_to_dscan_info(self._session, paste_data)
+            if url:
+                self.links[key] = url
+            return url
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+
+
 class DScanService:
-    def __init__(self, ships_file: str = 'ships.json'):
-        self.ships = self._load_ships(ships_file)
+    def __init__(self, ships_file: str = 'ships.json', ships: Optional[Dict] = None):
+        self.ships = ships if ships is not None else self._load_ships(ships_file)
         self.last_res: Optional[DScanResult] = None
         self.prev_res: Optional[DScanResult] = None
         self.last_parse_time: Optional[float] = None
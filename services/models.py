@@ -16,6 +16,11 @@ class PilotState(Enum):
     RATE_LIMITED = auto()
 
 
+# States a pilot doesn't leave without a new lookup.
+TERMINAL_STATES = (PilotState.FOUND, PilotState.NOT_FOUND, PilotState.ERROR,
+                   PilotState.CACHE_HIT, PilotState.RATE_LIMITED)
+
+
 @dataclass
 class PilotData:
     name: str
@@ -31,6 +36,35 @@ class PilotData:
     corp_alliance_resolved: bool = False
 
 
+@dataclass(frozen=True, slots=True)
+class PilotRecord:
+    """Read-only copy of a PilotData, stamped with the store version that
+    last changed it."""
+    name: str
+    state: PilotState
+    char_id: Optional[int] = None
+    corp_id: Optional[int] = None
+    alliance_id: Optional[int] = None
+    corp_name: Optional[str] = None
+    alliance_name: Optional[str] = None
+    stats: Optional[Dict] = None
+    stats_link: Optional[str] = None
+    error_msg: Optional[str] = None
+    version: int = 0
+
+    @classmethod
+    def of(cls, pilot: PilotData, version: int) -> 'PilotRecord':
+        return cls(pilot.name, pilot.state, pilot.char_id, pilot.corp_id, pilot.alliance_id,
+                   pilot.corp_name, pilot.alliance_name, pilot.stats, pilot.stats_link,
+                   pilot.error_msg, version)
+
+    def same_as(self, pilot: PilotData) -> bool:
+        return (self.state, self.char_id, self.corp_id, self.alliance_id, self.corp_name,
+                self.alliance_name, self.stats, self.stats_link, self.error_msg) == \
+            (pilot.state, pilot.char_id, pilot.corp_id, pilot.alliance_id, pilot.corp_name,
+             pilot.alliance_name, pilot.stats, pilot.stats_link, pilot.error_msg)
+
+
 @dataclass
 class DScanResult:
     ship_counts: Dict[str, Dict[str, int]] = field(default_factory=dict)
@@ -1,59 +1,293 @@
+import heapq
 import asyncio
+import hashlib
 import threading
 import aiohttp
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
 from loguru import logger
 
-from .models import PilotData, PilotState, get_invalid_pilot_name_reason
+from .models import PilotData, PilotRecord, PilotState, TERMINAL_STATES, get_invalid_pilot_name_reason
+from .pilot_store import PilotChanges, PilotStore
 from cache import CacheManager
+from live_cache import LiveCache, LIVE_CACHE_FILE
+from rate_limiter import RATE_LIMITER, RATE_LIMIT_STATE_FILE
 from esi import ESIResolver
 from zkill import ZKillStatsProvider, calc_danger
 from evekill import EveKillStatsProvider
 from cache_stats import CacheStatsProvider
 
+# Stats fetch order for pastes over ``stats_limit``: configured group
+# entities, pilots nothing is cached for, known killers, then the rest.
+PRIORITY_GROUP, PRIORITY_UNCACHED, PRIORITY_HIGH_KILLS, PRIORITY_REST = range(4)
+HIGH_KILLS = 100
+STATS_CONCURRENCY = 10
+# Pilots in these states are looked up again when they stay in local.
+RETRY_STATES = (PilotState.ERROR, PilotState.RATE_LIMITED)
+
+
+class PilotSubscription:
+    """Change notifications for one consumer running on its own event loop;
+    what changed is read from the pilot store."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._event = asyncio.Event()
+        self._woken = False
+        self._lock = threading.Lock()
+
+    def push(self):
+        with self._lock:
+            if self._woken:
+                return
+            self._woken = True
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass
+
+    async def wait(self, timeout: float, coalesce: float = 0) -> bool:
+        """False on timeout. Changes landing within ``coalesce`` seconds of
+        the first are taken together."""
+        try:
+            await asyncio.wait_for(self._event.wait(), max(0, timeout))
+        except asyncio.TimeoutError:
+            return False
+        if coalesce:
+            await asyncio.sleep(coalesce)
+        with self._lock:
+            self._event.clear()
+            self._woken = False
+        return True
+
+
+class PilotBackend:
+    """Caches, stats provider, event loop and HTTP session. One backend can
+    serve several PilotServices, e.g. one per API session."""
 
-class PilotService:
     def __init__(self, cache_dir: str = 'cache', stats_provider: str = 'zkill',
-                 rate_limit_delay: int = 5, stats_limit: int = 50):
+                 rate_limit_delay: int = 5):
         self.cache = CacheManager(cache_dir)
-        self.cache.load_cache()
-        self.esi = ESIResolver()
-        self.stats_limit = stats_limit
+        self.cache.start_warmup()
+        self.store = LiveCache(Path(cache_dir) / LIVE_CACHE_FILE)
+        RATE_LIMITER.load(Path(cache_dir) / RATE_LIMIT_STATE_FILE)
+        self.esi = ESIResolver(self.store)
 
         providers = {
-            'zkill': lambda: ZKillStatsProvider(rate_limit_delay),
-            'evekill': lambda: EveKillStatsProvider(rate_limit_delay),
+            'zkill': lambda: ZKillStatsProvider(rate_limit_delay, self.store),
+            'evekill': lambda: EveKillStatsProvider(rate_limit_delay, self.store),
             'cache': CacheStatsProvider
         }
         self.stats_provider = providers.get(
             stats_provider, providers['zkill'])()
 
-        self._pilots: Dict[str, PilotData] = {}
-        self._network_thread: Optional[threading.Thread] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._run_loop, daemon=True, name='pilot-network')
+        self._loop_thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        # One pooled session for the life of the backend, so connections and
+        # DNS lookups to ESI and the killboards are reused across pastes.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=50, ttl_dns_cache=300, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def shutdown(self):
+        async def close_session():
+            if self._session is not None:
+                await self._session.close()
+        if not self.loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(close_session(), self.loop).result(timeout=5)
+        except Exception as e:
+            logger.info(f"Error closing network session: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._loop_thread.join(timeout=5)
+        self.store.close()
 
     def clear_caches(self):
         self.stats_provider.client.clear_cache()
-        self.esi = ESIResolver()
+        self.store.clear()
+        self.esi = ESIResolver(self.store)
         logger.info("Caches cleared")
 
+    def get_cache_stats(self) -> Dict[str, Dict]:
+        return {**self.esi.cache_stats(), **self.stats_provider.client.cache_stats(),
+                'rate_limits': RATE_LIMITER.stats()}
+
+
+class PilotService:
+    def __init__(self, cache_dir: str = 'cache', stats_provider: str = 'zkill',
+                 rate_limit_delay: int = 5, stats_limit: int = 50,
+                 priority_entities: Iterable[str] = (), stats_budget: int = 200,
+                 stats_deadline: float = 30, backend: Optional[PilotBackend] = None):
+        # Without a backend the service owns one and shuts it down with itself.
+        self._owns_backend = backend is None
+        self.backend = backend or PilotBackend(cache_dir, stats_provider, rate_limit_delay)
+        self.stats_limit = stats_limit
+        self.priority_entities = set(priority_entities)
+        self.stats_budget = stats_budget
+        self.stats_deadline = stats_deadline
+
+        # PilotData the fetch stages write into; readers go through the store.
+        self._pilots: Dict[str, PilotData] = {}
+        self.pilot_store = PilotStore()
+        self.generation = 0
+        self.joined: Set[str] = set()
+        self.left: Set[str] = set()
+        self._paste_hash: Optional[bytes] = None
+        # (future, pilots) for each paste's network work still running, and
+        # the per-pilot stats tasks they have in flight (loop thread only).
+        self._runs: List[tuple] = []
+        self._stats_tasks: Dict[int, asyncio.Future] = {}
+        self._subscribers: Set[PilotSubscription] = set()
+        self._network_future = None
+
+    @property
+    def cache(self) -> CacheManager:
+        return self.backend.cache
+
+    @property
+    def store(self) -> LiveCache:
+        return self.backend.store
+
+    @property
+    def esi(self) -> ESIResolver:
+        return self.backend.esi
+
+    @property
+    def stats_provider(self):
+        return self.backend.stats_provider
+
+    @property
+    def _loop(self) -> asyncio.AbstractEventLoop:
+        return self.backend.loop
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        return await self.backend.get_session()
+
+    def shutdown(self):
+        if self._owns_backend:
+            self.backend.shutdown()
+        else:
+            self.reset()
+
+    def clear_caches(self):
+        self.backend.clear_caches()
+
+    def get_cache_stats(self) -> Dict[str, Dict]:
+        return self.backend.get_cache_stats()
+
     def set_pilots(self, clipboard_data: str) -> bool:
         names = self._parse_pilot_list(clipboard_data)
         if not names:
             return False
-        self._pilots = self._lookup_from_cache(names)
-        skip_stats = len(names) > self.stats_limit
-        self._fetch_missing_data(skip_stats)
+        paste_hash = hashlib.blake2b('\n'.join(sorted(set(names))).encode(), digest_size=16).digest()
+        in_flight = {id(p) for future, pilots in self._runs if not future.done() for p in pilots}
+        if paste_hash == self._paste_hash and not any(
+                p.state in RETRY_STATES or self._affiliation_failed(p, in_flight) for p in self._pilots.values()):
+            # Same pilots and nothing to retry: nobody joined or left.
+            self.joined, self.left = set(), set()
+            return True
+        self._paste_hash = paste_hash
+        self.generation += 1
+        previous = self._pilots
+        # Pilots who stayed keep their PilotData, including ones an earlier
+        # paste is still fetching: its requests finish them instead of new
+        # ones. Only joiners (and earlier failures) go through the caches.
+        kept = {n: p for n in names if (p := previous.get(n)) is not None
+                and (id(p) in in_flight or p.state not in RETRY_STATES)}
+        fresh = self._lookup_from_cache([n for n in dict.fromkeys(names) if n not in kept])
+        self._pilots = {n: kept.get(n) or fresh[n] for n in names}
+        self.pilot_store.replace(self._pilots)
+        self.joined = self._pilots.keys() - previous.keys()
+        self.left = previous.keys() - self._pilots.keys()
+        self._supersede(previous)
+        budget = None if len(names) <= self.stats_limit else self.stats_budget
+        self._fetch_missing_data(list(fresh.values()), budget,
+                                 [p for p in kept.values() if self._affiliation_failed(p, in_flight)])
+        self._publish()
         return True
 
-    def get_pilots(self) -> Dict[str, PilotData]:
+    def get_pilots(self) -> Dict[str, PilotRecord]:
         def sort_key(item):
             p = item[1]
             kills = p.stats.get('kills', -1) if p.stats else -1
             return -kills
-        return dict(sorted(self._pilots.items(), key=sort_key))
+        return dict(sorted(self.pilot_store.snapshot().records.items(), key=sort_key))
+
+    def get_pilots_by_name(self, names: Iterable[str]) -> Dict[str, PilotRecord]:
+        return self.pilot_store.get(names)
+
+    @property
+    def version(self) -> int:
+        return self.pilot_store.version
+
+    def changes_since(self, version: int) -> PilotChanges:
+        return self.pilot_store.changes_since(version)
+
+    def is_done(self) -> bool:
+        """True once every pilot is settled and no paste has network work left."""
+        return all(p.state in TERMINAL_STATES for p in self.pilot_store.snapshot().records.values()) and \
+            all(future.done() for future, _ in self._runs)
+
+    def subscribe(self) -> PilotSubscription:
+        """Change notifications for the calling event loop; pair with
+        ``unsubscribe``."""
+        sub = PilotSubscription(asyncio.get_running_loop())
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: PilotSubscription):
+        self._subscribers.discard(sub)
+
+    def _publish(self, pilots: Iterable[PilotData] = None):
+        """Commit changes to ``pilots`` to the store and wake subscribers.
+        Without pilots this only wakes them, e.g. for a new paste."""
+        if pilots is not None and not self.pilot_store.commit(pilots):
+            return
+        for sub in list(self._subscribers):
+            sub.push()
 
     def reset(self):
-        self._pilots = {}
+        self.generation += 1
+        previous, self._pilots = self._pilots, {}
+        self.pilot_store.replace(self._pilots)
+        self._paste_hash = None
+        self.joined, self.left = set(), set()
+        self._supersede(previous)
+        self._publish()
+
+    def _affiliation_failed(self, pilot: PilotData, in_flight: Set[int]) -> bool:
+        """Kept pilots whose last affiliation lookup came back empty."""
+        return bool(pilot.char_id) and not pilot.corp_alliance_resolved and id(pilot) not in in_flight \
+            and pilot.state in TERMINAL_STATES
+
+    def _is_current(self, pilot: PilotData) -> bool:
+        return self._pilots.get(pilot.name) is pilot
+
+    def _supersede(self, previous: Dict[str, PilotData]):
+        """Cancel network work for pilots the current paste no longer shows."""
+        self._runs = [(f, pilots) for f, pilots in self._runs if not f.done()]
+        for future, pilots in self._runs:
+            if not any(self._is_current(p) for p in pilots):
+                future.cancel()
+        dropped = [id(p) for p in previous.values() if not self._is_current(p)]
+        if dropped:
+            logger.debug(f"Paste {self.generation} dropped {len(dropped)} pilots")
+            self._loop.call_soon_threadsafe(self._cancel_stats_tasks, dropped)
+
+    def _cancel_stats_tasks(self, pilot_ids: List[int]):
+        for pilot_id in pilot_ids:
+            if (task := self._stats_tasks.get(pilot_id)) is not None:
+                task.cancel()
 
     def _parse_pilot_list(self, clipboard_data: str) -> Optional[List[str]]:
         lines = [line.strip()
@@ -70,9 +304,15 @@ class PilotService:
     def _lookup_from_cache(self, names: List[str]) -> Dict[str, PilotData]:
         pilots = {}
         stats_cache = self.stats_provider.client.cache
+        infos = {name: self.cache.get_char_info(name) for name in names}
+        self.esi.preload([n for n, info in infos.items() if not info],
+                         [info['char_id'] for info in infos.values() if info])
+        self.stats_provider.client.preload(
+            [info['char_id'] if info else self.esi.name_cache[n]
+             for n, info in infos.items() if info or self.esi.name_cache.peek(n)])
 
         for name in names:
-            info = self.cache.get_char_info(name)
+            info = infos[name]
             if info:
                 pilot = PilotData(
                     name=name, state=PilotState.CACHE_HIT, char_id=info['char_id'])
@@ -90,6 +330,8 @@ class PilotService:
                 pilot.stats_link = self.stats_provider.get_link(char_id)
                 self._apply_esi_cache(pilot)
                 self._apply_stats_from_cache(pilot, name, stats_cache)
+            elif name in self.esi.name_misses:
+                pilot = PilotData(name=name, state=PilotState.NOT_FOUND)
             else:
                 pilot = PilotData(name=name, state=PilotState.SEARCHING_ESI)
             pilots[name] = pilot
@@ -115,6 +357,9 @@ class PilotService:
                 pilot.stats = self.stats_provider.extract_display_stats(stats)
                 pilot.state = PilotState.FOUND
                 return True
+        if pilot.char_id in self.stats_provider.client.misses:
+            pilot.state = PilotState.NOT_FOUND
+            return True
         preloaded = self.cache.get_char_stats(name)
         if preloaded:
             k, l = preloaded['kills'], preloaded['losses']
@@ -124,85 +369,175 @@ class PilotService:
             return True
         return False
 
-    def _fetch_missing_data(self, skip_stats: bool = False):
-        pilots_esi = [p for p in self._pilots.values() if p.state == PilotState.SEARCHING_ESI]
-        pilots_stats = [p for p in self._pilots.values()
+    def _fetch_missing_data(self, pilots: List[PilotData], stats_budget: Optional[int] = None,
+                            retry_corp: List[PilotData] = ()):
+        pilots_esi = [p for p in pilots if p.state == PilotState.SEARCHING_ESI]
+        pilots_stats = [p for p in pilots
                         if p.state in [PilotState.CACHE_HIT, PilotState.SEARCHING_STATS]]
-        pilots_corp = [p for p in self._pilots.values()
-                       if p.corp_id and not p.corp_alliance_resolved]
+        pilots_corp = [p for p in pilots
+                       if p.char_id and not p.corp_alliance_resolved] + list(retry_corp)
 
-        if skip_stats:
-            for p in pilots_stats:
-                p.state = PilotState.FOUND
+        if stats_budget == 0:
+            self._finish_unfetched(pilots_stats)
+            pilots_stats = []
 
-        if pilots_esi or pilots_corp or (not skip_stats and pilots_stats):
+        if pilots_esi or pilots_corp or pilots_stats:
             self._start_network_fetch(
-                pilots_esi, pilots_stats, skip_stats, pilots_corp)
+                pilots_esi, pilots_stats, stats_budget, pilots_corp)
 
     def _start_network_fetch(self, pilots_esi: List[PilotData], pilots_stats: List[PilotData],
-                             skip_stats: bool, pilots_corp: List[PilotData] = None):
-        def run_fetch():
-            asyncio.run(self._fetch_network_data(
-                pilots_esi, pilots_stats, skip_stats, pilots_corp or []))
-
-        self._network_thread = threading.Thread(target=run_fetch, daemon=True)
-        self._network_thread.start()
+                             stats_budget: Optional[int], pilots_corp: List[PilotData] = None):
+        self._network_future = asyncio.run_coroutine_threadsafe(self._fetch_network_data(
+            pilots_esi, pilots_stats, stats_budget, pilots_corp or []), self._loop)
+        self._runs.append((self._network_future, pilots_esi + pilots_stats + (pilots_corp or [])))
+        self._network_future.add_done_callback(lambda _: self._publish())
 
     async def _fetch_network_data(self, pilots_esi: List[PilotData], pilots_stats: List[PilotData],
-                                  skip_stats: bool, pilots_corp: List[PilotData]):
-        connector = aiohttp.TCPConnector(limit=50)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            if pilots_esi:
-                tasks = [self._lookup_pilot_async(p, session, skip_stats) for p in pilots_esi]
-                await asyncio.gather(*tasks, return_exceptions=True)
-
-            if pilots_corp:
-                tasks = [self._resolve_corp_alliance_async(p, session) for p in pilots_corp
-                         if not p.corp_alliance_resolved]
-                if tasks:
-                    await asyncio.gather(*tasks, return_exceptions=True)
-
-            if not skip_stats and pilots_stats:
-                for p in pilots_stats:
-                    p.state = PilotState.SEARCHING_STATS
-                tasks = [self._fetch_stats_async(p, session) for p in pilots_stats]
-                await asyncio.gather(*tasks, return_exceptions=True)
-
-    async def _lookup_pilot_async(self, pilot: PilotData, session: aiohttp.ClientSession,
-                                  skip_stats: bool = False):
+                                  stats_budget: Optional[int], pilots_corp: List[PilotData],
+                                  session: aiohttp.ClientSession = None):
+        # Each stage covers the whole paste in as few bulk calls as possible,
+        # then fans the results back out to the waiting pilots.
+        # Pilots a newer paste dropped are filtered out between stages.
+        session = session or await self._get_session()
+        pilots_esi = [p for p in pilots_esi if self._is_current(p)]
+        if pilots_esi:
+            await self._resolve_names_stage(session, pilots_esi)
+        resolved = [p for p in pilots_esi if p.char_id and p.state != PilotState.ERROR]
+
+        pilots_corp = [p for p in pilots_corp + resolved
+                       if not p.corp_alliance_resolved and self._is_current(p)]
+        if pilots_corp:
+            await self._resolve_affiliations_stage(session, pilots_corp)
+
+        if stats_budget == 0:
+            self._finish_unfetched(resolved)
+            resolved = []
+
+        pilots_stats = [p for p in pilots_stats + resolved if self._is_current(p)]
+        if pilots_stats:
+            await self._fetch_stats_stage(session, pilots_stats, stats_budget)
+
+    async def _resolve_names_stage(self, session: aiohttp.ClientSession, pilots: List[PilotData]):
         try:
-            if pilot.char_id is None:
-                name_map = await self.esi.resolve_names_to_ids(session, [pilot.name])
-                if pilot.name not in name_map:
-                    pilot.state = PilotState.NOT_FOUND
-                    return
-                pilot.char_id = name_map[pilot.name]
-
-            if pilot.corp_id is None:
-                char_info = await self.esi.get_char_info(session, pilot.char_id)
-                pilot.corp_id = char_info.get('corporation_id')
-                pilot.alliance_id = char_info.get('alliance_id')
-
-                ids = [i for i in [pilot.corp_id, pilot.alliance_id] if i]
-                if ids:
-                    names = await self.esi.resolve_ids_to_names(session, ids)
-                    pilot.corp_name = names.get(pilot.corp_id, 'Unknown')
-                    pilot.alliance_name = names.get(pilot.alliance_id) if pilot.alliance_id else None
-                pilot.corp_alliance_resolved = True
-
-            pilot.stats_link = self.stats_provider.get_link(pilot.char_id)
-
-            if skip_stats:
-                pilot.state = PilotState.FOUND
-                return
-
-            pilot.state = PilotState.SEARCHING_STATS
-            await self._fetch_stats_async(pilot, session)
-
+            name_map = await self.esi.resolve_names_to_ids(session, [p.name for p in pilots])
         except Exception as e:
-            logger.info(f"Error looking up pilot {pilot.name}: {e}")
-            pilot.state = PilotState.ERROR
-            pilot.error_msg = str(e)
+            logger.info(f"Error resolving {len(pilots)} pilot names: {e}")
+            for p in pilots:
+                p.state = PilotState.ERROR
+                p.error_msg = str(e)
+            self._publish(pilots)
+            return
+        for p in pilots:
+            if p.name not in name_map:
+                p.state = PilotState.NOT_FOUND
+                continue
+            p.char_id = name_map[p.name]
+            p.stats_link = self.stats_provider.get_link(p.char_id)
+        self._publish(pilots)
+
+    async def _resolve_affiliations_stage(self, session: aiohttp.ClientSession, pilots: List[PilotData]):
+        try:
+            affiliations = await self.esi.get_affiliations(session, [p.char_id for p in pilots])
+        except Exception as e:
+            logger.info(f"Error resolving affiliations for {len(pilots)} pilots: {e}")
+            affiliations = {}
+        infos = [affiliations.get(p.char_id, {}) for p in pilots]
+        # Names the built-in cache already knows need no ESI round trip; the
+        # rest go out in one deduplicated /universe/names/ pass.
+        corp_ids = {info['corporation_id'] for info in infos if info.get('corporation_id')}
+        alliance_ids = {info['alliance_id'] for info in infos if info.get('alliance_id')}
+        names = self.cache.get_names_by_ids_batch(corp_ids | alliance_ids)
+        unknown = (corp_ids | alliance_ids) - names.keys()
+        try:
+            names.update(await self.esi.resolve_ids_to_names(session, list(unknown)) if unknown else {})
+        except Exception as e:
+            logger.info(f"Error resolving {len(unknown)} corp/alliance names: {e}")
+
+        for p, info in zip(pilots, infos):
+            # Pilots the lookup had nothing for stay unresolved and are
+            # retried on the next paste.
+            if info:
+                logger.debug(f"ESI char_info for {p.name} ({p.char_id}): {info}")
+                p.corp_id = info.get('corporation_id')
+                p.alliance_id = info.get('alliance_id')
+                p.corp_name = names.get(p.corp_id, 'Unknown') if p.corp_id else None
+                p.alliance_name = names.get(p.alliance_id) if p.alliance_id else None
+                p.corp_alliance_resolved = True
+        self._publish(pilots)
+
+    async def _fetch_stats_stage(self, session: aiohttp.ClientSession, pilots: List[PilotData],
+                                 budget: Optional[int]):
+        """Fetch stats highest priority first. With a budget, stop after
+        ``budget`` requests or ``stats_deadline`` seconds; pilots still queued
+        then keep whatever the caches had."""
+        # Pilots resolved over the network weren't preloaded with the paste.
+        await self.stats_provider.client.preload_async(p.char_id for p in pilots if p.char_id)
+        queue = [(self._stats_priority(p), i, p) for i, p in enumerate(pilots)]
+        heapq.heapify(queue)
+        for p in pilots:
+            p.state = PilotState.SEARCHING_STATS
+        self._publish(pilots)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.stats_deadline if budget is not None else None
+        remaining = len(pilots) if budget is None else budget
+        unfetched = []
+
+        async def worker():
+            nonlocal remaining
+            while queue and remaining > 0 and (deadline is None or loop.time() < deadline):
+                pilot = heapq.heappop(queue)[2]
+                if not self._is_current(pilot):
+                    continue
+                remaining -= 1
+                task = self._stats_tasks[id(pilot)] = asyncio.ensure_future(
+                    self._fetch_stats_async(pilot, session))
+                done = None
+                try:
+                    timeout = None if deadline is None else deadline - loop.time()
+                    done, _ = await asyncio.wait({task}, timeout=timeout)
+                finally:
+                    self._stats_tasks.pop(id(pilot), None)
+                    task.cancel()
+                    # The fetch was cancelled, by a new paste or along with
+                    # the stage, unless the deadline cut it off (done empty).
+                    if done is None or done:
+                        self._settle_cancelled([pilot])
+                if not done:
+                    unfetched.append(pilot)
+
+        workers = len(pilots) if budget is None else min(STATS_CONCURRENCY, budget)
+        try:
+            await asyncio.gather(*[worker() for _ in range(workers)])
+        except asyncio.CancelledError:
+            self._settle_cancelled([p for _, _, p in queue])
+            raise
+        unfetched += [p for _, _, p in queue]
+        if unfetched:
+            logger.info(f"Stats budget or deadline reached; {len(unfetched)} of {len(pilots)} pilots left on cached stats")
+            self._finish_unfetched(unfetched)
+
+    def _stats_priority(self, pilot: PilotData) -> tuple:
+        if self.priority_entities and not self.priority_entities.isdisjoint(
+                (pilot.name, pilot.corp_name, pilot.alliance_name)):
+            return PRIORITY_GROUP, 0
+        if not pilot.stats:
+            return PRIORITY_UNCACHED, 0
+        kills = pilot.stats.get('kills', 0)
+        return (PRIORITY_HIGH_KILLS if kills >= HIGH_KILLS else PRIORITY_REST), -kills
+
+    def _settle_cancelled(self, pilots: List[PilotData]):
+        """Move pilots whose stats fetch was cancelled out of SEARCHING_STATS."""
+        pilots = [p for p in pilots if p.state == PilotState.SEARCHING_STATS]
+        for p in pilots:
+            p.state = PilotState.CACHE_HIT if p.stats else PilotState.ERROR
+            p.error_msg = 'Stats lookup cancelled'
+        if pilots:
+            self._publish(pilots)
+
+    def _finish_unfetched(self, pilots: List[PilotData]):
+        for p in pilots:
+            p.state = PilotState.CACHE_HIT if p.stats else PilotState.FOUND
+        self._publish(pilots)
 
     async def _fetch_stats_async(self, pilot: PilotData, session: aiohttp.ClientSession):
         try:
@@ -221,25 +556,4 @@ class PilotService:
         except Exception as e:
             pilot.state = PilotState.CACHE_HIT if pilot.stats else PilotState.ERROR
             pilot.error_msg = str(e)
-
-    async def _resolve_corp_alliance_async(self, pilot: PilotData, session: aiohttp.ClientSession):
-        if pilot.corp_alliance_resolved:
-            return
-        try:
-            char_info = await self.esi.get_char_info(session, pilot.char_id)
-            logger.debug(f"ESI char_info for {pilot.name} ({pilot.char_id}): {char_info}")
-            new_corp_id = char_info.get('corporation_id')
-            new_alliance_id = char_info.get('alliance_id')
-
-            ids = [i for i in [new_corp_id, new_alliance_id] if i]
-            if ids:
-                names = await self.esi.resolve_ids_to_names(session, ids)
-                logger.debug(f"ESI names for {pilot.name}: corp={new_corp_id}->{names.get(new_corp_id)}, alliance={new_alliance_id}->{names.get(new_alliance_id)}")
-                pilot.corp_id = new_corp_id
-                pilot.alliance_id = new_alliance_id
-                pilot.corp_name = names.get(new_corp_id, 'Unknown')
-                pilot.alliance_name = names.get(new_alliance_id) if new_alliance_id else None
-
-            pilot.corp_alliance_resolved = True
-        except Exception as e:
-            logger.info(f"Error resolving corp/alliance for {pilot.name}: {e}")
+        self._publish([pilot])
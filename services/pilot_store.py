@@ -0,0 +1,88 @@
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+from .models import PilotData, PilotRecord
+
+
+@dataclass(frozen=True, slots=True)
+class PilotChanges:
+    """Records changed after the version asked for, up to ``version``.
+    ``full`` means the caller was too far behind and got the whole table;
+    it should drop anything it holds that isn't in ``records``."""
+    version: int
+    records: Mapping[str, PilotRecord]
+    removed: Tuple[str, ...] = ()
+    full: bool = False
+
+
+class PilotStore:
+    """Versioned copy-on-write table of PilotRecords.
+
+    The writer owns the PilotData it fetches into and commits them after
+    each change; every commit copies the changed pilots into new records
+    stamped with the next version and swaps in a new table. Readers only
+    ever see a complete table and never take a lock.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._records: Mapping[str, PilotRecord] = MappingProxyType({})
+        # Writer side: the PilotData each name is committed from.
+        self._sources: Dict[str, PilotData] = {}
+        # Names dropped since ``_removed_since``; readers further behind get
+        # a full table instead.
+        self._removed: Dict[str, int] = {}
+        self._removed_since = 0
+        self._lock = threading.Lock()
+
+    def replace(self, pilots: Dict[str, PilotData]):
+        """Start a new table. Pilots carried over as the same PilotData keep
+        their records and versions; the rest are new."""
+        with self._lock:
+            version = self.version + 1
+            old = self._records
+            records = {}
+            for name, pilot in pilots.items():
+                record = old.get(name)
+                if self._sources.get(name) is not pilot or record is None or not record.same_as(pilot):
+                    record = PilotRecord.of(pilot, version)
+                records[name] = record
+            # Keep one paste's worth of removals.
+            self._removed = {n: version for n in old.keys() - records.keys()}
+            self._removed_since = self.version
+            self._sources = dict(pilots)
+            self._records = MappingProxyType(records)
+            self.version = version
+
+    def commit(self, pilots: Iterable[PilotData]) -> List[str]:
+        """Publish changes made to ``pilots``; returns the names that changed.
+        Pilots the current table no longer holds are ignored."""
+        with self._lock:
+            version = self.version + 1
+            changed = {p.name: PilotRecord.of(p, version) for p in pilots
+                       if self._sources.get(p.name) is p and not self._records[p.name].same_as(p)}
+            if changed:
+                self._records = MappingProxyType({**self._records, **changed})
+                self.version = version
+            return list(changed)
+
+    def snapshot(self) -> PilotChanges:
+        version, records = self.version, self._records
+        return PilotChanges(version, records, full=True)
+
+    def get(self, names: Iterable[str]) -> Dict[str, PilotRecord]:
+        records = self._records
+        return {n: r for n in names if (r := records.get(n)) is not None}
+
+    def changes_since(self, version: int) -> PilotChanges:
+        # The writer sets ``version`` last, so reading it first means anything
+        # else seen here is at least that new; a change may then be reported
+        # twice, but never missed.
+        current = self.version
+        records, removed, removed_since = self._records, self._removed, self._removed_since
+        if version < removed_since:
+            return PilotChanges(current, records, full=True)
+        return PilotChanges(current, MappingProxyType({n: r for n, r in records.items() if r.version > version}),
+                            tuple(n for n, v in removed.items() if v > version))
@@ -2,6 +2,7 @@
 import asyncio
 import aiohttp
 import json
+from rate_limiter import RATE_LIMITER
 
 async def get_ship_types_esi():
     """Get all ship types by querying the ships category directly"""
@@ -9,7 +10,8 @@ async def get_ship_types_esi():
         async with aiohttp.ClientSession() as session:
             # Get ship groups from category 6 (Ships)
             category_url = "https://esi.evetech.net/latest/universe/categories/6/"
-            async with session.get(category_url) as response:
+            async with RATE_LIMITER.slot(category_url) as slot, session.get(category_url) as response:
+                slot.update(response)
                 if response.status != 200:
                     print(f"Failed to get ship category: {response.status}")
                     return {}
@@ -22,7 +24,8 @@ async def get_ship_types_esi():
             all_ship_type_ids = []
             for group_id in ship_group_ids:
                 group_url = f"https://esi.evetech.net/latest/universe/groups/{group_id}/"
-                async with session.get(group_url) as response:
+                async with RATE_LIMITER.slot(group_url) as slot, session.get(group_url) as response:
+                    slot.update(response)
                     if response.status == 200:
                         group_data = await response.json()
                         type_ids = group_data.get('types', [])
@@ -75,7 +78,8 @@ async def _get_types_info_batch(session, type_ids):
 async def _fetch_type_info(session, type_id, url):
     """Fetch individual type info"""
     try:
-        async with session.get(url, timeout=10) as response:
+        async with RATE_LIMITER.slot(url) as slot, session.get(url, timeout=10) as response:
+            slot.update(response)
             if response.status == 200:
                 return await response.json()
     except Exception:
@@ -89,7 +93,8 @@ async def _get_group_name(session, group_id):
         
     try:
         url = f"https://esi.evetech.net/latest/universe/groups/{group_id}/"
-        async with session.get(url, timeout=10) as response:
+        async with RATE_LIMITER.slot(url) as slot, session.get(url, timeout=10) as response:
+            slot.update(response)
             if response.status == 200:
                 data = await response.json()
                 return data.get('name', 'Unknown')
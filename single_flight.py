@@ -0,0 +1,58 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesces concurrent async calls for the same key onto one task.
+
+    The first caller for a key starts ``fn``; callers arriving while it is
+    still running await the same task instead of issuing their own request.
+    Waiters are shielded from each other, so cancelling one paste does not
+    cancel a request another paste is waiting on; the request itself is
+    cancelled once its last waiter is.
+    """
+
+    def __init__(self, name: str = ''):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        while True:
+            fut = self._inflight.get(key)
+            if fut is not None and not fut.done():
+                self.coalesced += 1
+            else:
+                self.calls += 1
+                fut = asyncio.ensure_future(fn())
+                self._inflight[key] = fut
+                self._waiters[key] = 0
+                fut.add_done_callback(lambda f, key=key: self._forget(key, f))
+            self._waiters[key] += 1
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if fut.cancelled() and not asyncio.current_task().cancelling():
+                    # The shared call was cancelled under us, not this
+                    # caller: treat it as a miss and start over.
+                    continue
+                if not fut.done() and self._inflight.get(key) is fut:
+                    self._waiters[key] -= 1
+                    if not self._waiters[key]:
+                        # Forget the key before cancelling, so a caller
+                        # arriving now starts a new call instead of joining
+                        # the cancelled one.
+                        del self._inflight[key]
+                        del self._waiters[key]
+                        fut.cancel()
+                raise
+
+    def _forget(self, key: Hashable, fut: asyncio.Future):
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+            del self._waiters[key]
+
+    def stats(self) -> Dict:
+        return {'requests': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._inflight)}
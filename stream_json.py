@@ -0,0 +1,51 @@
+import json
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = ' \t\r\n,'
+
+
+def iter_records(fpath, chunk_size=1 << 20):
+    """Yield the records of a JSON array or NDJSON file one at a time.
+
+    The file is read in chunks of ``chunk_size`` characters, so memory stays
+    bounded by the largest single record rather than the whole file. Elements
+    of a JSON array are expected to be objects (or arrays/strings), which
+    can't be mistaken for complete values when cut at a chunk boundary.
+    """
+    with open(fpath, 'r', encoding='utf-8') as f:
+        head = f.read(chunk_size)
+        stripped = head.lstrip()
+        if stripped.startswith('['):
+            yield from _iter_array(f, stripped[1:], chunk_size)
+            return
+        f.seek(0)
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _iter_array(f, buf, chunk_size):
+    pos = 0
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in _SEPARATORS:
+                pos += 1
+            if pos < len(buf):
+                break
+            buf, pos = f.read(chunk_size), 0
+            if not buf:
+                raise ValueError("unterminated JSON array")
+
+        if buf[pos] == ']':
+            return
+        try:
+            obj, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield obj
+        pos = end
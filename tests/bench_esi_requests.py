@@ -0,0 +1,99 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+from aiohttp import web
+from loguru import logger
+
+from esi import ESIResolver
+from cache import CacheManager
+from services.pilot_service import PilotService
+from bench_pilot_fetch import make_stub, start_stub, run_pastes
+
+N_CORPS = 7
+N_ALLIANCES = 3
+
+
+class PerPilotService(PilotService):
+    """Previous affiliation stage: GET /characters/{id}/ plus a
+    /universe/names/ call for every pilot."""
+
+    async def _resolve_affiliations_stage(self, session, pilots):
+        async def resolve(p):
+            info = await self.esi.get_char_info(session, p.char_id)
+            ids = [i for i in (info.get('corporation_id'), info.get('alliance_id')) if i]
+            if ids:
+                names = await self.esi.resolve_ids_to_names(session, ids)
+                p.corp_id, p.alliance_id = info.get('corporation_id'), info.get('alliance_id')
+                p.corp_name = names.get(p.corp_id, 'Unknown')
+                p.alliance_name = names.get(p.alliance_id) if p.alliance_id else None
+            p.corp_alliance_resolved = True
+        await asyncio.gather(*[resolve(p) for p in pilots], return_exceptions=True)
+
+
+def write_sources(src_dir, n_pilots):
+    """Sources for a built-in cache with ``n_pilots`` known pilots. Only some
+    of the corps and alliances the stub hands out are known, so the names
+    pass has something left to resolve."""
+    chars_file = os.path.join(src_dir, 'chars.ndjson')
+    with open(chars_file, 'w') as f:
+        for i in range(n_pilots):
+            char_id = 2_000_000_000 + i
+            f.write(json.dumps({'name': f'Local Pilot {i}', 'character_id': char_id,
+                                'corporation_id': 1_000_000 + char_id % N_CORPS,
+                                'alliance_id': 99_000_000 + char_id % N_ALLIANCES}) + '\n')
+    corps_file = os.path.join(src_dir, 'corps_alliances.json')
+    with open(corps_file, 'w') as f:
+        json.dump({'corporations': {str(1_000_000 + i): f'Corp {i}' for i in range(N_CORPS - 2)},
+                   'alliances': {str(99_000_000 + i): f'Alliance {i}' for i in range(N_ALLIANCES - 1)}}, f)
+    return chars_file, corps_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ESI requests per paste against a local stub')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--miss-rate', type=float, default=0.1, help='share of pilots not in the built-in cache')
+    parser.add_argument('--port', type=int, default=18722)
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    counts = Counter()
+
+    @web.middleware
+    async def count_requests(req, handler):
+        path = req.path
+        counts['/characters/{id}/' if path.startswith('/latest/characters/') and path[-2].isdigit()
+               else path.removeprefix('/latest')] += 1
+        return await handler(req)
+
+    app = make_stub(0.001)
+    app.middlewares.append(count_requests)
+    start_stub(args.port, app)
+    ESIResolver.base_url = f'http://127.0.0.1:{args.port}/latest'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, 'cache')
+        CacheManager(cache_dir).build_cache(*write_sources(tmp, max(args.sizes)))
+        for name, cls in (('per-pilot', PerPilotService), ('batched', PilotService)):
+            svc = cls(cache_dir, 'cache', stats_limit=max(args.sizes))
+            svc.cache.load_cache()
+            for size in args.sizes:
+                n_miss = int(size * args.miss_rate)
+                paste = '\n'.join([f'Local Pilot {i}' for i in range(size - n_miss)] +
+                                  [f'New Pilot {i}' for i in range(n_miss)])
+                counts.clear()
+                latency = run_pastes(svc, [paste])[0]
+                detail = ', '.join(f'{k} {v}' for k, v in sorted(counts.items()))
+                print(f"{name:<10} {size:>5} pilots ({n_miss} misses): {sum(counts.values()):>5} requests"
+                      f" in {latency:6.0f} ms   [{detail}]")
+            svc.shutdown()
+
+
+if __name__ == "__main__":
+    main()
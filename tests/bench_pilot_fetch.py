@@ -0,0 +1,140 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import zlib
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+import concurrent.futures
+import aiohttp
+from aiohttp import web
+from loguru import logger
+
+import zkill
+from esi import ESIResolver
+from rate_limiter import HOST_LIMITS
+from services.pilot_service import PilotService
+from services.models import PilotState
+
+TERMINAL = (PilotState.FOUND, PilotState.NOT_FOUND, PilotState.ERROR,
+            PilotState.CACHE_HIT, PilotState.RATE_LIMITED)
+
+
+def make_stub(delay: float) -> web.Application:
+    """Minimal ESI + zkill stand-in answering every lookup after ``delay``."""
+    async def ids(req):
+        await asyncio.sleep(delay)
+        names = await req.json()
+        return web.json_response({'characters': [{'name': n, 'id': 90_000_000 + zlib.crc32(n.encode()) % 10_000_000} for n in names]})
+
+    async def names(req):
+        await asyncio.sleep(delay)
+        return web.json_response([{'id': i, 'name': f'Entity {i}', 'category': 'corporation'}
+                                  for i in await req.json()])
+
+    async def character(req):
+        await asyncio.sleep(delay)
+        char_id = int(req.match_info['char_id'])
+        return web.json_response({'corporation_id': 1_000_000 + char_id % 7, 'alliance_id': 99_000_000 + char_id % 3})
+
+    async def affiliation(req):
+        await asyncio.sleep(delay)
+        return web.json_response([{'character_id': i, 'corporation_id': 1_000_000 + i % 7,
+                                   'alliance_id': 99_000_000 + i % 3} for i in await req.json()])
+
+    async def stats(req):
+        await asyncio.sleep(delay)
+        return web.json_response({'shipsDestroyed': 10, 'shipsLost': 3})
+
+    app = web.Application()
+    app.router.add_post('/latest/universe/ids/', ids)
+    app.router.add_post('/latest/universe/names/', names)
+    app.router.add_get('/latest/characters/{char_id}/', character)
+    app.router.add_post('/latest/characters/affiliation/', affiliation)
+    app.router.add_get('/api/stats/characterID/{char_id}/', stats)
+    return app
+
+
+def start_stub(port: int, app: web.Application):
+    # The stub stands in for every host; don't let the real per-host limits
+    # turn the benchmark into a measure of the token bucket.
+    HOST_LIMITS['127.0.0.1'] = (1e6, 10**6, 1000)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', port).start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+
+class LegacyPilotService(PilotService):
+    """Previous behaviour: a new thread, event loop and session per paste."""
+
+    def _start_network_fetch(self, pilots_esi, pilots_stats, stats_budget, pilots_corp=None):
+        async def fetch():
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=50)) as session:
+                await self._fetch_network_data(pilots_esi, pilots_stats, stats_budget, pilots_corp or [], session)
+        future = self._network_future = concurrent.futures.Future()
+
+        def run():
+            asyncio.run(fetch())
+            future.set_result(None)
+        threading.Thread(target=run, daemon=True).start()
+
+
+def run_pastes(svc: PilotService, pastes, timeout=30):
+    latencies = []
+    for paste in pastes:
+        svc.clear_caches()
+        start = time.perf_counter()
+        svc._network_future = None
+        svc.set_pilots(paste)
+        # Cache hits are terminal right away while their corp refresh is still
+        # in flight, so wait for the fetch itself as well.
+        while not all(p.state in TERMINAL for p in svc.get_pilots().values()) or \
+                (svc._network_future is not None and not svc._network_future.done()):
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError('paste did not complete')
+            time.sleep(0.0005)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<12} mean {statistics.mean(latencies):7.1f} ms   median {statistics.median(latencies):7.1f} ms"
+          f"   p95 {p95:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Paste-to-complete latency against a local ESI/zkill stub')
+    parser.add_argument('--pastes', type=int, default=50)
+    parser.add_argument('--pilots', type=int, default=30)
+    parser.add_argument('--delay', type=float, default=0.005, help='stub response delay in seconds')
+    parser.add_argument('--port', type=int, default=18721)
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    start_stub(args.port, make_stub(args.delay))
+    stub = f'http://127.0.0.1:{args.port}'
+    ESIResolver.base_url = f'{stub}/latest'
+    zkill.ZKillClient.base_url = property(lambda self: f'{stub}/api')
+
+    pastes = ['\n'.join(f'Bench Pilot {i}-{j}' for j in range(args.pilots)) for i in range(args.pastes)]
+    print(f"{args.pastes} pastes x {args.pilots} pilots, stub delay {args.delay * 1000:.0f} ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, cls in (('per-paste', LegacyPilotService), ('persistent', PilotService)):
+            svc = cls(os.path.join(tmp, name), 'zkill')
+            svc.cache.load_cache()
+            run_pastes(svc, pastes[:3])
+            report(name, run_pastes(svc, pastes))
+            svc.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import sys
+import os
+import json
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import marisa_trie
+import numpy as np
+
+import cache_bundle
+from cache_bundle import BUNDLES_DIR, FORMAT_VERSION, MANIFEST, open_current, write_bundle, \
+    describe_source, source_changed
+
+
+def _write(cache_dir, names=('a', 'b')):
+    trie = marisa_trie.Trie(names)
+    ids = np.arange(1, len(trie) + 1, dtype='<u4')
+    return write_bundle(cache_dir, trie, {'ids.u32': (ids, len(trie))}, {})
+
+
+def _age(bundle, seconds):
+    t = time.time() - seconds
+    os.utime(bundle.path, (t, t))
+
+
+def test_write_and_open(tmp_path):
+    bundle = _write(tmp_path, ('x', 'y', 'z'))
+    opened = open_current(tmp_path)
+    assert opened.path == bundle.path and opened.current
+    assert opened.entry_count == 3
+    assert opened.verify('ids.u32', 3, 4)
+    assert np.fromfile(opened.file('ids.u32'), dtype='<u4').tolist() == [1, 2, 3]
+    assert not list((tmp_path / BUNDLES_DIR).glob('.tmp-*'))
+
+
+def test_verify_rejects_mismatches(tmp_path):
+    bundle = _write(tmp_path, ('x', 'y', 'z'))
+    assert not bundle.verify('ids.u32', 4)
+    assert not bundle.verify('ids.u32', 3, 8)
+    assert not bundle.verify('missing.u32', 3)
+    with open(bundle.file('ids.u32'), 'r+b') as f:
+        f.write(b'\xff')
+    assert not bundle.verify('ids.u32', 3, 4)
+
+
+def test_other_format_only_opened_for_conversion(tmp_path):
+    bundle = _write(tmp_path)
+    manifest = json.loads(bundle.file(MANIFEST).read_text())
+    manifest['format_version'] = FORMAT_VERSION - 1
+    bundle.file(MANIFEST).write_text(json.dumps(manifest))
+    assert open_current(tmp_path) is None
+    old = open_current(tmp_path, any_format=True)
+    assert old.path == bundle.path and not old.current
+
+
+def test_source_changed(tmp_path):
+    src = tmp_path / 'names.pkl'
+    src.write_bytes(b'abc')
+    rec = describe_source(src)
+    assert not source_changed(src, rec, time.time())
+    # Touched but identical content still matches by checksum.
+    os.utime(src, (time.time() + 10, time.time() + 10))
+    assert not source_changed(src, rec, time.time())
+    src.write_bytes(b'abd')
+    assert source_changed(src, rec, time.time())
+    # Files the bundle wasn't built from only count once newer than the build.
+    assert source_changed(src, None, time.time() - 60)
+    assert not source_changed(src, None, time.time() + 60)
+
+
+def test_previous_bundle_is_kept(tmp_path):
+    first = _write(tmp_path)
+    _age(first, cache_bundle.REPLACED_TTL * 2)
+    second = _write(tmp_path)
+    assert first.path.exists() and second.path.exists()
+    assert open_current(tmp_path).path == second.path
+
+
+def test_replaced_bundles_removed_after_ttl(tmp_path):
+    first = _write(tmp_path)
+    _age(first, cache_bundle.REPLACED_TTL * 3)
+    second = _write(tmp_path)
+    third = _write(tmp_path)
+    # second was only just replaced, so first has not been gone long enough
+    assert first.path.exists()
+    _age(second, cache_bundle.REPLACED_TTL * 2)
+    fourth = _write(tmp_path)
+    assert not first.path.exists()
+    assert second.path.exists() and third.path.exists() and fourth.path.exists()
+
+
+def test_abandoned_temp_dirs_removed(tmp_path):
+    _write(tmp_path)
+    fresh = tmp_path / BUNDLES_DIR / '.tmp-fresh'
+    stale = tmp_path / BUNDLES_DIR / '.tmp-stale'
+    fresh.mkdir()
+    stale.mkdir()
+    t = time.time() - 7200
+    os.utime(stale, (t, t))
+    _write(tmp_path)
+    assert fresh.exists() and not stale.exists()
@@ -0,0 +1,132 @@
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import CacheManager
+from cache_bundle import FORMAT_VERSION, MANIFEST
+from cache_overlay import CacheOverlay, load_overlay, write_segment
+
+
+def test_apply_records():
+    overlay = CacheOverlay()
+    assert overlay.apply({'name': 'Some Pilot', 'character_id': 1, 'corporation_id': 10})
+    assert overlay.apply({'type': 'corporation', 'id': 10, 'name': 'Some Corp'})
+    assert overlay.apply({'type': 'alliance', 'id': 20, 'name': 'Some Alliance'})
+    assert overlay.apply({'type': 'stats', 'character_id': 1, 'kills': 5})
+    assert overlay.chars['Some Pilot'] == (1, 10, 0)
+    assert overlay.corps == {10: 'Some Corp'} and overlay.alliances == {20: 'Some Alliance'}
+    assert overlay.get_stats(1) == {'kills': 5, 'losses': 0}
+    assert overlay.canonical('some PILOT') == 'Some Pilot'
+    assert len(overlay) == 4
+
+
+def test_invalid_records_skipped():
+    overlay = CacheOverlay()
+    assert not overlay.apply({'name': 'No Id'})
+    assert not overlay.apply({'type': 'corporation', 'id': 10})
+    assert not overlay.apply({'type': 'stats', 'kills': 1})
+    assert not overlay.apply({'type': 'ship', 'id': 1, 'name': 'Rifter'})
+    assert len(overlay) == 0
+
+
+def test_rename():
+    overlay = CacheOverlay()
+    overlay.apply({'name': 'Old Name', 'character_id': 1})
+    overlay.apply({'name': 'New Name', 'character_id': 1})
+    assert 'Old Name' not in overlay.chars and overlay.canonical('old name') is None
+    assert overlay.canonical('new name') == 'New Name'
+    assert overlay.is_renamed('Old Name', 1) and not overlay.is_renamed('New Name', 1)
+
+
+def test_segments_round_trip(tmp_path):
+    delta = tmp_path / 'delta.ndjson'
+    delta.write_text('\n'.join(json.dumps(r) for r in [
+        {'name': 'Some Pilot', 'character_id': 1},
+        {'type': 'corporation', 'id': 10},
+        {'type': 'stats', 'character_id': 1, 'kills': 3, 'losses': 2},
+    ]))
+    seg_dir = tmp_path / 'overlays' / 'b1'
+    overlay = CacheOverlay()
+    seg = write_segment(seg_dir, overlay, delta)
+    assert overlay.segments == [seg]
+    # Only accepted records are persisted.
+    assert len(seg.read_text().splitlines()) == 2
+    loaded = load_overlay(seg_dir)
+    assert loaded.chars == overlay.chars and loaded.stats == overlay.stats
+    assert loaded.segments == [seg]
+    assert len(load_overlay(tmp_path / 'missing')) == 0
+
+
+def _build(tmp_path):
+    chars = tmp_path / 'chars.ndjson'
+    with open(chars, 'w') as f:
+        for i in range(100):
+            f.write(json.dumps({'name': f'Pilot {i}', 'character_id': 2_000_000_000 + i,
+                                'corporation_id': 98_000_000 + i % 5, 'alliance_id': 99_000_000}) + '\n')
+    corps_alliances = tmp_path / 'ca.json'
+    corps_alliances.write_text(json.dumps({
+        'corporations': {str(98_000_000 + i): f'Corp {i}' for i in range(5)},
+        'alliances': {'99000000': 'Alliance 0'}}))
+    cache_dir = tmp_path / 'cache'
+    CacheManager(cache_dir).build_cache(chars, corps_alliances)
+    return cache_dir
+
+
+def _delta(tmp_path):
+    delta = tmp_path / 'delta.ndjson'
+    delta.write_text('\n'.join(json.dumps(r) for r in [
+        {'name': 'Renamed Pilot', 'character_id': 2_000_000_001, 'corporation_id': 98_000_003},
+        {'name': 'New Pilot', 'character_id': 2_000_001_000, 'corporation_id': 98_000_004},
+        {'type': 'corporation', 'id': 98_000_003, 'name': 'New Corp Name'},
+        {'type': 'stats', 'character_id': 2_000_000_002, 'kills': 7, 'losses': 1},
+    ]))
+    return delta
+
+
+def _check(cache):
+    assert cache.get_char_info('Pilot 1') is None
+    assert cache.get_char_info('Renamed Pilot')['corp_name'] == 'New Corp Name'
+    assert cache.get_char_info('new pilot')['char_id'] == 2_000_001_000
+    assert cache.get_char_stats('Pilot 2') == {'kills': 7, 'losses': 1}
+    assert cache.get_names_by_ids_batch([2_000_000_001, 98_000_003, 98_000_000]) == {
+        2_000_000_001: 'Renamed Pilot', 98_000_003: 'New Corp Name', 98_000_000: 'Corp 0'}
+
+
+def test_apply_delta_and_compact(tmp_path):
+    cache_dir = _build(tmp_path)
+    cache = CacheManager(cache_dir)
+    cache.load_cache()
+    assert cache.apply_delta(_delta(tmp_path)) is not None
+    _check(cache)
+
+    # Other processes see the segment on their next start.
+    reopened = CacheManager(cache_dir)
+    reopened.load_cache()
+    _check(reopened)
+
+    bundle = reopened.compact()
+    assert bundle is not None
+    compacted = CacheManager(cache_dir)
+    compacted.load_cache()
+    assert compacted._bundle.path == bundle.path and not compacted._overlay
+    assert compacted.get_tid('Pilot 1') is None
+    _check(compacted)
+
+
+def test_format_rebuild_keeps_overlay(tmp_path):
+    cache_dir = _build(tmp_path)
+    cache = CacheManager(cache_dir)
+    cache.apply_delta(_delta(tmp_path))
+    old = cache._bundle
+    manifest = json.loads(old.file(MANIFEST).read_text())
+    manifest['format_version'] = FORMAT_VERSION - 1
+    old.file(MANIFEST).write_text(json.dumps(manifest))
+
+    rebuilt = CacheManager(cache_dir)
+    rebuilt.load_cache()
+    assert rebuilt._bundle.path != old.path and rebuilt._bundle.current
+    assert len(rebuilt._overlay.segments) == 1
+    _check(rebuilt)
+    # The case-folded index is part of the rebuilt bundle.
+    assert rebuilt.get_tid('PILOT 7') == rebuilt.get_tid('Pilot 7') is not None
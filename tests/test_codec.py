@@ -0,0 +1,65 @@
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from services.api import codec
+from services.api.codec import (JSON_MEDIA, MSGPACK_MEDIA, NDJSON_MEDIA, SSE_MEDIA,
+                                FrameDecoder, StreamEncoder, dumps, loads, negotiate)
+
+EVENT = {'version': 3, 'pilots': {
+    'A': {'state': 'FOUND', 'corp_id': 10, 'corp_name': 'Corp', 'alliance_id': 20, 'alliance_name': 'Alliance'},
+    'B': {'state': 'FOUND', 'corp_id': 10, 'corp_name': 'Corp', 'alliance_id': None, 'alliance_name': None},
+}}
+
+
+def test_dumps_loads(monkeypatch):
+    obj = {'a': [1, 2.5, None], 'b': 'ü'}
+    assert loads(dumps(obj)) == obj
+    monkeypatch.setattr(codec, 'orjson', None)
+    assert dumps(obj) == json.dumps(obj, separators=(',', ':')).encode()
+    assert loads(dumps(obj)) == obj
+
+
+def test_negotiate(monkeypatch):
+    offered = (JSON_MEDIA, NDJSON_MEDIA, MSGPACK_MEDIA)
+    assert negotiate(None, offered) == JSON_MEDIA
+    assert negotiate('text/html, */*', offered) == JSON_MEDIA
+    assert negotiate(f'{NDJSON_MEDIA}, {JSON_MEDIA}', offered) == NDJSON_MEDIA
+    assert negotiate(MSGPACK_MEDIA, offered) == (MSGPACK_MEDIA if codec.msgpack else JSON_MEDIA)
+    monkeypatch.setattr(codec, 'msgpack', None)
+    assert negotiate(MSGPACK_MEDIA, offered) == JSON_MEDIA
+
+
+def test_sse_frames():
+    frame = StreamEncoder(SSE_MEDIA).encode(EVENT)
+    assert frame.startswith(b'data: ') and frame.endswith(b'\n\n')
+    assert loads(frame[len(b'data: '):]) == EVENT
+
+
+def test_msgpack_interning_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    encoder, decoder = StreamEncoder(MSGPACK_MEDIA), FrameDecoder()
+    first = msgpack.unpackb(encoder.encode(EVENT))
+    # Each name goes out once, in the id tables.
+    assert first['corps'] == [[10, 'Corp']] and first['alliances'] == [[20, 'Alliance']]
+    assert 'corp_name' not in first['pilots']['A']
+    assert decoder.decode(first) == EVENT
+
+    patch = {'version': 4, 'pilots': {'A': {'state': 'CACHE_HIT'}}}
+    second = msgpack.unpackb(encoder.encode(patch))
+    assert 'corps' not in second and 'alliances' not in second
+    # A patch without names decodes to the same patch the JSON stream sends.
+    assert decoder.decode(second) == patch
+
+
+def test_msgpack_renamed_corp():
+    msgpack = pytest.importorskip('msgpack')
+    encoder, decoder = StreamEncoder(MSGPACK_MEDIA), FrameDecoder()
+    decoder.decode(msgpack.unpackb(encoder.encode(EVENT)))
+    patch = {'version': 4, 'pilots': {'B': {'corp_name': 'Renamed'}}}
+    frame = msgpack.unpackb(encoder.encode(patch))
+    assert frame['corps'] == [[10, 'Renamed']]
+    assert decoder.decode(frame)['pilots']['B'] == {'corp_id': 10, 'corp_name': 'Renamed'}
@@ -0,0 +1,61 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live_cache import LiveCache
+from negative_cache import BloomFilter, NegativeCache
+
+
+def test_bloom_filter_no_false_negatives():
+    bloom = BloomFilter(1000)
+    keys = [str(i) for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert sum(str(i) in bloom for i in range(1000, 11000)) < 5
+
+
+def test_exact_entries():
+    misses = NegativeCache(10, 60)
+    misses.add(1)
+    misses.add_many([2, 3])
+    assert 1 in misses and 3 in misses and 4 not in misses
+
+
+def test_bloom_covers_evicted_entries():
+    misses = NegativeCache(2, 60, bloom_capacity=100)
+    misses.add_many(range(10))
+    assert len(misses.entries) == 2
+    assert all(i in misses for i in range(10))
+    assert misses.stats()['bloom_hits'] == 8
+
+
+def test_bloom_rotation_expires_keys():
+    misses = NegativeCache(1, 0.4, bloom_capacity=100)
+    misses.add_many(['a', 'b'])
+    time.sleep(0.25)
+    # Half the ttl later the key moves to the older filter and still counts.
+    assert 'a' in misses
+    time.sleep(0.25)
+    assert 'a' not in misses
+
+
+def test_clear():
+    misses = NegativeCache(1, 60, bloom_capacity=100)
+    misses.add_many(['a', 'b'])
+    misses.clear()
+    assert 'a' not in misses and 'b' not in misses
+
+
+def test_store_write_through(tmp_path):
+    store = LiveCache(tmp_path / 'live.sqlite3')
+    try:
+        NegativeCache(10, 60, store=store, ns='miss').add_many([1, 2])
+        store.flush()
+        misses = NegativeCache(10, 60, store=store, ns='miss')
+        assert 1 not in misses
+        misses.preload([1, 2, 3])
+        assert 1 in misses and 2 in misses and 3 not in misses
+    finally:
+        store.close()
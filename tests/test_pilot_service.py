@@ -0,0 +1,259 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import zlib
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+from aiohttp import web
+from loguru import logger
+
+import zkill
+from esi import ESIResolver
+from rate_limiter import HOST_LIMITS
+from services.models import PilotState, TERMINAL_STATES
+from services.pilot_service import PilotService
+
+
+def char_id(name):
+    return 90_000_000 + zlib.crc32(name.encode()) % 10_000_000
+
+
+class Stub:
+    """ESI and zkill stand-in on a local port. ``delay`` holds seconds per
+    route, routes in ``failing`` answer 500 and ``requests`` counts calls."""
+
+    def __init__(self):
+        self.delay = {}
+        self.failing = set()
+        self.requests = Counter()
+        app = web.Application()
+        app.router.add_post('/latest/universe/ids/', self._route('ids', self._ids))
+        app.router.add_post('/latest/universe/names/', self._route('names', self._names))
+        app.router.add_post('/latest/characters/affiliation/', self._route('affiliation', self._affiliation))
+        app.router.add_get('/api/stats/characterID/{char_id}/', self._route('stats', self._stats))
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        self.loop.run_until_complete(web.TCPSite(self.runner, '127.0.0.1', 0).start())
+        self.port = self.runner.addresses[0][1]
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def reset(self):
+        self.delay.clear()
+        self.failing.clear()
+        self.requests.clear()
+
+    def _route(self, name, handler):
+        async def route(req):
+            self.requests[name] += 1
+            await asyncio.sleep(self.delay.get(name, 0))
+            if name in self.failing:
+                return web.json_response({'error': 'down'}, status=500)
+            return await handler(req)
+        return route
+
+    async def _ids(self, req):
+        return web.json_response({'characters': [{'name': n, 'id': char_id(n)} for n in await req.json()]})
+
+    async def _names(self, req):
+        return web.json_response([{'id': i, 'name': f'Entity {i}', 'category': 'corporation'}
+                                  for i in await req.json()])
+
+    async def _affiliation(self, req):
+        return web.json_response([{'character_id': i, 'corporation_id': 1_000_000 + i % 7,
+                                   'alliance_id': 99_000_000 + i % 3} for i in await req.json()])
+
+    async def _stats(self, req):
+        return web.json_response({'shipsDestroyed': 10, 'shipsLost': 3})
+
+
+@pytest.fixture(scope='module')
+def stub():
+    return Stub()
+
+
+@pytest.fixture
+def make_service(stub, tmp_path, monkeypatch):
+    base = f'http://127.0.0.1:{stub.port}'
+    monkeypatch.setattr(ESIResolver, 'base_url', f'{base}/latest')
+    monkeypatch.setattr(zkill.ZKillClient, 'base_url', property(lambda self: f'{base}/api'))
+    monkeypatch.setitem(HOST_LIMITS, '127.0.0.1', (1e6, 10**6, 1000))
+    logger.disable('')
+    stub.reset()
+    services = []
+
+    def make(stats_provider='zkill', **kwargs):
+        svc = PilotService(str(tmp_path / 'cache'), stats_provider, **kwargs)
+        services.append(svc)
+        return svc
+    yield make
+    for svc in services:
+        svc.shutdown()
+    logger.enable('')
+
+
+def wait_done(svc, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not svc.is_done():
+        if time.monotonic() > deadline:
+            raise TimeoutError('paste did not complete')
+        time.sleep(0.005)
+    return svc.get_pilots()
+
+
+def paste(*names):
+    return '\n'.join(names)
+
+
+def test_cache_provider_paste(make_service):
+    svc = make_service('cache')
+    assert svc.set_pilots(paste('Pilot One', 'Pilot Two'))
+    pilots = wait_done(svc)
+    assert all(p.state in TERMINAL_STATES for p in pilots.values())
+    one = pilots['Pilot One']
+    assert one.char_id == char_id('Pilot One')
+    assert one.corp_name == f'Entity {one.corp_id}'
+
+
+@pytest.mark.parametrize('provider', ['cache', 'zkill'])
+def test_failed_affiliations_retried(make_service, stub, provider):
+    # zkill pilots end FOUND and are kept across pastes; cache-only ones end
+    # in ERROR and are looked up again.
+    svc = make_service(provider)
+    stub.failing.add('affiliation')
+    svc.set_pilots(paste('Pilot One', 'Pilot Two'))
+    pilots = wait_done(svc)
+    assert pilots['Pilot One'].char_id and pilots['Pilot One'].corp_id is None
+
+    stub.failing.clear()
+    # The same paste again is not short-circuited while lookups are missing.
+    svc.set_pilots(paste('Pilot One', 'Pilot Two'))
+    pilots = wait_done(svc)
+    assert all(p.corp_name == f'Entity {p.corp_id}' for p in pilots.values())
+    assert svc._pilots['Pilot One'].corp_alliance_resolved
+    assert stub.requests['ids'] == 1
+
+    requests = dict(stub.requests)
+    svc.set_pilots(paste('Pilot One', 'Pilot Two'))
+    wait_done(svc)
+    assert stub.requests == requests
+
+
+def test_paste_diffing(make_service, stub):
+    svc = make_service()
+    svc.set_pilots(paste('Pilot A', 'Pilot B', 'Pilot C'))
+    wait_done(svc)
+    kept = svc._pilots['Pilot B']
+    stub.requests.clear()
+
+    svc.set_pilots(paste('Pilot B', 'Pilot C', 'Pilot D'))
+    assert svc.joined == {'Pilot D'} and svc.left == {'Pilot A'}
+    pilots = wait_done(svc)
+    assert svc._pilots['Pilot B'] is kept
+    assert set(pilots) == {'Pilot B', 'Pilot C', 'Pilot D'}
+    # Only the joiner went out; its corp name may already be cached.
+    assert (stub.requests['ids'], stub.requests['affiliation'], stub.requests['stats']) == (1, 1, 1)
+
+
+def test_identical_paste_short_circuits(make_service, stub):
+    svc = make_service()
+    svc.set_pilots(paste('Pilot A', 'Pilot B'))
+    wait_done(svc)
+    generation, version = svc.generation, svc.version
+    assert svc.set_pilots(paste('  Pilot B', 'Pilot A  '))
+    assert (svc.generation, svc.version) == (generation, version)
+    assert svc.joined == set() and svc.left == set()
+
+
+def test_identical_paste_retries_failures(make_service, stub):
+    svc = make_service()
+    stub.failing.add('stats')
+    svc.set_pilots(paste('Pilot A', 'Pilot B'))
+    assert wait_done(svc)['Pilot A'].state == PilotState.ERROR
+
+    stub.failing.clear()
+    generation = svc.generation
+    svc.set_pilots(paste('Pilot A', 'Pilot B'))
+    assert svc.generation == generation + 1
+    pilots = wait_done(svc)
+    assert all(p.state == PilotState.FOUND and p.stats['kills'] == 10 for p in pilots.values())
+    assert svc.joined == set() and svc.left == set()
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError('condition not reached')
+        time.sleep(0.005)
+
+
+def test_new_paste_cancels_dropped_run(make_service, stub):
+    svc = make_service()
+    stub.delay['stats'] = 5
+    svc.set_pilots(paste('Pilot A', 'Pilot B'))
+    wait_for(lambda: len(svc._stats_tasks) == 2)
+    old_run = svc._network_future
+
+    stub.delay.clear()
+    start = time.monotonic()
+    svc.set_pilots(paste('Pilot C'))
+    pilots = wait_done(svc)
+    assert time.monotonic() - start < 2
+    assert old_run.cancelled()
+    assert set(pilots) == {'Pilot C'} and pilots['Pilot C'].state == PilotState.FOUND
+
+
+def test_new_paste_cancels_only_dropped_pilots(make_service, stub):
+    svc = make_service()
+    stub.delay['stats'] = 0.5
+    svc.set_pilots(paste('Pilot A', 'Pilot B'))
+    wait_for(lambda: len(svc._stats_tasks) == 2)
+    dropped, kept = svc._pilots['Pilot A'], svc._pilots['Pilot B']
+
+    svc.set_pilots(paste('Pilot B', 'Pilot C'))
+    pilots = wait_done(svc)
+    assert svc._pilots['Pilot B'] is kept
+    assert all(p.state == PilotState.FOUND for p in pilots.values())
+    # B's stats came from the first paste's request, not a second one.
+    assert stub.requests['stats'] == 3
+    assert dropped.state != PilotState.SEARCHING_STATS
+    assert not svc._stats_tasks
+
+
+def test_stats_budget(make_service, stub):
+    svc = make_service(stats_limit=3, stats_budget=2)
+    names = [f'Pilot {i}' for i in range(6)]
+    svc.set_pilots(paste(*names))
+    pilots = wait_done(svc)
+    assert stub.requests['stats'] == 2
+    assert sum(1 for p in pilots.values() if p.stats) == 2
+    # The rest are settled without stats rather than left searching.
+    assert all(p.state == PilotState.FOUND for p in pilots.values())
+
+
+def test_stats_deadline(make_service, stub):
+    svc = make_service(stats_limit=3, stats_budget=100, stats_deadline=0.3)
+    stub.delay['stats'] = 5
+    start = time.monotonic()
+    svc.set_pilots(paste(*[f'Pilot {i}' for i in range(6)]))
+    pilots = wait_done(svc)
+    assert time.monotonic() - start < 2
+    assert all(p.state == PilotState.FOUND and not p.stats for p in pilots.values())
+
+
+def test_cancelled_stats_settle(make_service, stub):
+    svc = make_service()
+    stub.delay['stats'] = 5
+    svc.set_pilots(paste('Pilot A', 'Pilot B', 'Pilot C'))
+    wait_for(lambda: len(svc._stats_tasks) == 3)
+    svc._loop.call_soon_threadsafe(svc._cancel_stats_tasks, [id(svc._pilots['Pilot A'])])
+    wait_for(lambda: svc.get_pilots()['Pilot A'].state == PilotState.ERROR)
+    svc._network_future.cancel()
+    pilots = wait_done(svc)
+    assert all(p.state == PilotState.ERROR for p in pilots.values())
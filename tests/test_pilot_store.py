@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.models import PilotData, PilotState
+from services.pilot_store import PilotStore
+
+
+def _pilots(*names):
+    return {n: PilotData(name=n) for n in names}
+
+
+def test_replace_and_commit():
+    store = PilotStore()
+    pilots = _pilots('a', 'b')
+    store.replace(pilots)
+    assert store.version == 1
+    snap = store.snapshot()
+    assert snap.full and set(snap.records) == {'a', 'b'}
+
+    pilots['a'].state = PilotState.FOUND
+    assert store.commit(pilots.values()) == ['a']
+    assert store.version == 2
+    assert store.get(['a', 'x'])['a'].state == PilotState.FOUND
+    # Snapshots already handed out never change.
+    assert snap.records['a'].state == PilotState.SEARCHING_ESI
+
+
+def test_commit_without_changes_keeps_version():
+    store = PilotStore()
+    pilots = _pilots('a')
+    store.replace(pilots)
+    assert store.commit(pilots.values()) == []
+    assert store.version == 1
+
+
+def test_commit_ignores_replaced_pilots():
+    store = PilotStore()
+    old = _pilots('a')
+    store.replace(old)
+    store.replace(_pilots('a'))
+    old['a'].state = PilotState.ERROR
+    assert store.commit(old.values()) == []
+    assert store.get(['a'])['a'].state == PilotState.SEARCHING_ESI
+
+
+def test_changes_since():
+    store = PilotStore()
+    pilots = _pilots('a', 'b')
+    store.replace(pilots)
+    v1 = store.version
+    pilots['b'].char_id = 5
+    store.commit(pilots.values())
+    changes = store.changes_since(v1)
+    assert not changes.full and changes.version == store.version
+    assert list(changes.records) == ['b'] and changes.removed == ()
+    assert not store.changes_since(store.version).records
+
+
+def test_replace_keeps_unchanged_records():
+    store = PilotStore()
+    pilots = _pilots('a', 'b')
+    store.replace(pilots)
+    v1 = store.version
+    store.replace({'a': pilots['a'], 'c': PilotData(name='c')})
+    changes = store.changes_since(v1)
+    assert store.get(['a'])['a'].version == v1
+    assert list(changes.records) == ['c'] and changes.removed == ('b',)
+
+
+def test_far_behind_reader_gets_full_table():
+    store = PilotStore()
+    store.replace(_pilots('a', 'b'))
+    v1 = store.version
+    store.replace(_pilots('b', 'c'))
+    store.replace(_pilots('c', 'd'))
+    changes = store.changes_since(v1)
+    assert changes.full and set(changes.records) == {'c', 'd'}
@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import asyncio
+import threading
+from rate_limiter import HostLimiter
+
+
+def test_waiters_are_served_in_fifo_order():
+    async def main():
+        limiter = HostLimiter('test', 1e6, 10**6, 1)
+        order = []
+
+        async def worker(i):
+            await limiter.acquire()
+            order.append(i)
+            await asyncio.sleep(0.001)
+            limiter.release()
+        tasks = []
+        for i in range(50):
+            tasks.append(asyncio.ensure_future(worker(i)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+    assert asyncio.run(main()) == list(range(50))
+
+
+def test_capped_waiters_do_not_poll():
+    async def main():
+        limiter = HostLimiter('test', 1e6, 10**6, 2)
+        takes = 0
+        take = limiter._take
+
+        def counting_take():
+            nonlocal takes
+            takes += 1
+            return take()
+        limiter._take = counting_take
+
+        async def worker():
+            await limiter.acquire()
+            await asyncio.sleep(0.002)
+            limiter.release()
+        await asyncio.gather(*[worker() for _ in range(200)])
+        return takes
+    # Each acquire tries at most a couple of times, however long it queues.
+    assert asyncio.run(main()) < 3 * 200
+
+
+def test_token_bucket_spaces_requests():
+    async def main():
+        limiter = HostLimiter('test', 100.0, 1, 10)
+        start = time.monotonic()
+        for _ in range(6):
+            await limiter.acquire()
+            limiter.release()
+        return time.monotonic() - start
+    assert asyncio.run(main()) >= 0.045
+
+
+def test_cancelled_head_passes_the_slot_on():
+    async def main():
+        limiter = HostLimiter('test', 1e6, 10**6, 1)
+        await limiter.acquire()
+        head = asyncio.ensure_future(limiter.acquire())
+        nxt = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        head.cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.wait_for(nxt, 1)
+        return len(limiter._queue), limiter.active
+    assert asyncio.run(main()) == (0, 1)
+
+
+def test_release_wakes_waiter_on_another_loop():
+    limiter = HostLimiter('test', 1e6, 10**6, 1)
+    asyncio.run(limiter.acquire())
+    acquired = threading.Event()
+
+    def other_loop():
+        asyncio.run(limiter.acquire())
+        acquired.set()
+    thread = threading.Thread(target=other_loop)
+    thread.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+    limiter.release()
+    assert acquired.wait(1)
+    thread.join()
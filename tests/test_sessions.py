@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.api.sessions import DEFAULT_SESSION, MAX_SESSION_ID, SessionManager
+from services.pilot_service import PilotBackend
+
+
+def _manager(tmp_path, idle_ttl=1800):
+    return SessionManager(PilotBackend(str(tmp_path), 'cache'), ships={}, idle_ttl=idle_ttl)
+
+
+def test_sessions_share_backend(tmp_path):
+    manager = _manager(tmp_path)
+    try:
+        a, b = manager.get('a'), manager.get('b')
+        assert manager.get('a') is a and a is not b
+        assert a.pilots is not b.pilots and a.dscan is not b.dscan
+        assert a.pilots.backend is b.pilots.backend is manager.backend
+        assert manager.get(None).id == manager.get('').id == DEFAULT_SESSION
+        assert manager.get('x' * 100).id == 'x' * MAX_SESSION_ID
+        assert manager.stats() == {'active': 4, 'streaming': 0}
+    finally:
+        manager.close()
+
+
+def test_expire_idle(tmp_path):
+    manager = _manager(tmp_path, idle_ttl=60)
+    try:
+        idle, active, streaming = manager.get('idle'), manager.get('active'), manager.get('streaming')
+        idle.last_seen -= 120
+        streaming.last_seen -= 120
+        streaming.streams = 1
+        assert manager.expire_idle() == 1
+        assert set(manager.sessions) == {'active', 'streaming'}
+        assert manager.stats() == {'active': 2, 'streaming': 1}
+        # Coming back after expiry starts a fresh session.
+        assert manager.get('idle') is not idle
+        assert manager.get('active') is active
+    finally:
+        manager.close()
+
+
+def test_close(tmp_path):
+    manager = _manager(tmp_path)
+    manager.get('a')
+    manager.close()
+    assert manager.sessions == {}
+    assert not manager.backend.loop.is_running()
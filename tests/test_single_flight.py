@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from single_flight import SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_calls_share_one_request():
+    async def main():
+        sf = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 42
+        results = await asyncio.gather(*[sf.do('k', fetch) for _ in range(5)])
+        return results, calls, sf.stats()
+    results, calls, stats = run(main())
+    assert results == [42] * 5
+    assert len(calls) == 1
+    assert stats == {'requests': 1, 'coalesced': 4, 'in_flight': 0}
+
+
+def test_cancelling_one_waiter_keeps_request_for_others():
+    async def main():
+        sf = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return 'ok'
+        a = asyncio.ensure_future(sf.do('k', fetch))
+        b = asyncio.ensure_future(sf.do('k', fetch))
+        await asyncio.sleep(0)
+        a.cancel()
+        return await b, a.cancelled()
+    assert run(main()) == ('ok', True)
+
+
+def test_cancel_last_waiter_then_rejoin_starts_new_request():
+    async def main():
+        sf = SingleFlight()
+        started = []
+
+        async def fetch():
+            started.append(1)
+            await asyncio.sleep(0.01)
+            return len(started)
+        first = asyncio.ensure_future(sf.do('k', fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        # Arrive before the cancelled request's done callbacks have run.
+        second = asyncio.ensure_future(sf.do('k', fetch))
+        result = await second
+        return result, first.cancelled(), sf.stats()
+    result, first_cancelled, stats = run(main())
+    assert first_cancelled
+    assert result == 2
+    assert stats['requests'] == 2 and stats['in_flight'] == 0
+
+
+def test_shared_request_cancelled_elsewhere_is_retried():
+    async def main():
+        sf = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return 'done'
+        waiter = asyncio.ensure_future(sf.do('k', fetch))
+        await asyncio.sleep(0)
+        sf._inflight['k'].cancel()
+        return await waiter, sf.calls
+    assert run(main()) == ('done', 2)
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def main():
+        sf = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError('boom')
+        results = await asyncio.gather(sf.do('k', fail), sf.do('k', fail), return_exceptions=True)
+
+        async def ok():
+            return 1
+        return results, await sf.do('k', ok)
+    results, after = run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert after == 1
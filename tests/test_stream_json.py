@@ -0,0 +1,44 @@
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from stream_json import iter_records
+
+RECORDS = [{'name': f'Pilot {i}', 'character_id': 2_000_000_000 + i, 'tags': ['a, b', ']']} for i in range(50)]
+
+
+def test_json_array_across_chunks(tmp_path):
+    fpath = tmp_path / 'chars.json'
+    fpath.write_text('  \n' + json.dumps(RECORDS, indent=1), encoding='utf-8')
+    # Chunks far smaller than a record force every boundary case.
+    for chunk_size in (5, 7, 64, 1 << 20):
+        assert list(iter_records(fpath, chunk_size)) == RECORDS
+
+
+def test_ndjson(tmp_path):
+    fpath = tmp_path / 'chars.ndjson'
+    fpath.write_text('\n'.join(json.dumps(r) for r in RECORDS) + '\n\n', encoding='utf-8')
+    assert list(iter_records(fpath, 16)) == RECORDS
+
+
+def test_empty_array(tmp_path):
+    fpath = tmp_path / 'empty.json'
+    fpath.write_text('[ ]', encoding='utf-8')
+    assert list(iter_records(fpath)) == []
+
+
+def test_unterminated_array(tmp_path):
+    fpath = tmp_path / 'cut.json'
+    fpath.write_text(json.dumps(RECORDS[:3])[:-1], encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_records(fpath, 8))
+
+
+def test_truncated_record(tmp_path):
+    fpath = tmp_path / 'cut.json'
+    fpath.write_text(json.dumps(RECORDS[:3])[:-10], encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_records(fpath, 8))
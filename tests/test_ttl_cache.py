@@ -0,0 +1,55 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ttl_cache import TTLCache
+
+
+def test_lru_eviction():
+    cache = TTLCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert 'a' in cache
+    cache['c'] = 3
+    assert 'b' not in cache and cache.get('a') == 1 and cache['c'] == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expiry():
+    cache = TTLCache(10, ttl=0.05)
+    cache['a'] = 1
+    cache.set('b', 2, ttl=60)
+    assert 'a' in cache
+    time.sleep(0.06)
+    assert 'a' not in cache and cache.get('a', 'gone') == 'gone'
+    assert cache['b'] == 2
+    assert cache.stats()['expirations'] == 1
+
+
+def test_counters_and_peek():
+    cache = TTLCache(10)
+    cache.update({'a': 1, 'b': 2})
+    assert cache.peek('a') == 1 and cache.peek('x', 0) == 0
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 0
+    assert 'a' in cache and 'x' not in cache
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_peek_keeps_lru_order():
+    cache = TTLCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache.peek('a')
+    cache['c'] = 3
+    assert cache.peek('a') is None and cache.peek('b') == 2
+
+
+def test_missing_pop_del():
+    cache = TTLCache(10)
+    cache.update({'a': 1, 'b': 2})
+    assert cache.missing(['a', 'x', 'b', 'y']) == ['x', 'y']
+    assert cache.pop('a') == 1 and cache.pop('a', 'none') == 'none'
+    del cache['b']
+    assert len(cache) == 0
@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leb128
+import pytest
+
+from varint import decode_leb128
+
+VALUES = [0, 1, -1, 63, -64, 64, -65, 127, 128, 300, -300, 2**31 - 1, 2**32 + 5, -2**40, 2**63 - 1, -2**63]
+
+
+def test_signed_round_trip():
+    data = b''.join(bytes(leb128.i.encode(v)) for v in VALUES)
+    assert decode_leb128(data).tolist() == VALUES
+
+
+def test_unsigned():
+    values = [0, 1, 127, 128, 300, 2**32, 2**64 - 1]
+    data = b''.join(bytes(leb128.u.encode(v)) for v in values)
+    assert decode_leb128(data, signed=False).view('<u8').tolist() == values
+
+
+def test_truncated_tail_dropped():
+    data = bytes(leb128.i.encode(5)) + bytes(leb128.i.encode(1000))[:-1]
+    assert decode_leb128(data).tolist() == [5]
+
+
+def test_empty():
+    assert decode_leb128(b'').tolist() == []
+    assert decode_leb128(b'\x80\x80').tolist() == []
+
+
+def test_too_long_rejected():
+    with pytest.raises(ValueError):
+        decode_leb128(b'\x80' * 10 + b'\x01')
@@ -0,0 +1,112 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded in-memory cache with LRU eviction and per-entry TTLs.
+
+    Supports the dict operations the clients use (``in``, ``[]``, ``get``,
+    ``update``, ``pop``, ``del``). Lookups through ``in`` and ``get`` are
+    counted as hits or misses; expired entries count as misses and are
+    dropped on access. ``[]`` does not re-check expiry, so an ``in`` check
+    followed by ``[]`` stays consistent. Safe to share between the UI and
+    network threads.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None, name: str = ''):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def _lookup(self, key, count: bool):
+        # Caller holds the lock.
+        entry = self._data.get(key, _MISSING)
+        if entry is not _MISSING and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            entry = _MISSING
+        if entry is _MISSING:
+            if count:
+                self.misses += 1
+            return _MISSING
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return entry[0]
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return self._lookup(key, True) is not _MISSING
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._data[key][0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key, True)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def update(self, items: Dict, ttl: Optional[float] = None):
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def peek(self, key, default=None):
+        """Like ``get`` but without touching the counters or LRU order."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def missing(self, keys) -> list:
+        return [k for k in keys if self.peek(k, _MISSING) is _MISSING]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
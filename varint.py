@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def decode_leb128(data, signed=True):
+    """Decode a buffer of back to back LEB128 varints into an int64 array.
+
+    Signed values use the SLEB128 sign extension written by ``leb128.i``.
+    A truncated varint at the end of the buffer is dropped.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf < 0x80)
+    if not len(ends):
+        return np.zeros(0, dtype=np.int64)
+    buf = buf[:ends[-1] + 1]
+
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lens = ends - starts + 1
+    if lens.max() > 10:
+        raise ValueError(f"varint of {lens.max()} bytes does not fit 64 bits")
+
+    # Bit offset of every byte inside its own varint, then OR the 7 bit groups
+    # of each varint together in one reduceat pass.
+    pos = np.arange(len(buf), dtype=np.uint64) - np.repeat(starts, lens).astype(np.uint64)
+    groups = (buf & 0x7f).astype(np.uint64) << (pos * np.uint64(7))
+    vals = np.bitwise_or.reduceat(groups, starts)
+
+    if signed:
+        # Sign extend from the last group's 0x40 bit; 10 byte varints already
+        # carry all 64 bits.
+        neg = ((buf[ends] & 0x40) != 0) & (lens < 10)
+        vals[neg] |= ~np.uint64(0) << (lens[neg].astype(np.uint64) * np.uint64(7))
+    return vals.view(np.int64)
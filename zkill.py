@@ -36,11 +36,16 @@ class ZKillClient(BaseAPIClient):
             return {'error': 'not_found'}
         return data
 
+    def _persisted_data(self, data):
+        # Full stats carry large monthly/top-list breakdowns; only the
+        # scalar summary is needed after a restart.
+        return {k: v for k, v in data.items() if not isinstance(v, (dict, list))}
+
 
 class ZKillStatsProvider(StatsInterface):
-    def __init__(self, rate_limit_retry_delay=5):
+    def __init__(self, rate_limit_retry_delay=5, store=None):
         from base_api_client import APIClientFactory
-        self.client = APIClientFactory.create_client('zkill', rate_limit_retry_delay=rate_limit_retry_delay)
+        self.client = APIClientFactory.create_client('zkill', rate_limit_retry_delay=rate_limit_retry_delay, store=store)
 
     async def get_stats(self, session: aiohttp.ClientSession, char_id: int) -> Dict:
         return await self.client._get_char_short_stats_with_session(session, char_id)